@@ -3,32 +3,66 @@
 from flask import Flask, render_template, redirect, request, jsonify, url_for
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from functools import wraps
-import requests
 import logging
 import re
+import struct
+import threading
+import time
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from config.zebby import APP_SECRET_KEY
+
+try:
+    # e.g. 'redis://localhost:6379/0' to fan out room emits across workers
+    from config.zebby import SOCKETIO_MESSAGE_QUEUE
+except ImportError:
+    SOCKETIO_MESSAGE_QUEUE = None
 from database import (
-    get_zebby_user_info, get_user_by_id,
+    zebby_http, get_zebby_user_info, get_user_by_id,
     create_profile, get_profile_by_id, get_profile_by_slug, is_slug_available,
     update_profile, delete_profile, get_user_profiles,
     get_user_role, get_profile_members, add_profile_member, update_member_role,
     remove_profile_member, transfer_ownership,
     create_activation_link, get_activation_link, is_activation_link_valid,
     redeem_activation_link, cancel_activation_link, get_profile_activation_links,
-    get_channel_strips, get_channel_strip, create_channel_strip, update_channel_strip,
+    get_channel_strips, get_channel_strip, get_channel_profile_and_role,
+    create_channel_strip, update_channel_strip,
     delete_channel_strip, reorder_channel_strips, update_fader_level,
-    update_mute_state, update_solo_state, update_vu_levels_bulk,
-    get_responsibility, take_responsibility, drop_responsibility,
-    update_profile_activity, get_active_users
+    update_mute_state, update_solo_state, update_vu_levels_bulk, get_vu_levels, bulk_update_channel_state,
+    get_responsibility, load_profile_bundle, take_responsibility, drop_responsibility, drop_responsibility_bulk,
+    update_profile_activity, flush_profile_activity, get_active_users, cleanup_old_sessions, cleanup_old_activity
 )
 
 app = Flask(__name__)
 app.secret_key = APP_SECRET_KEY
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+class OrjsonSocketIOJSON:
+    """orjson adapter with the json.dumps/json.loads signature SocketIO expects."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+
+# Initialize SocketIO (orjson is optional; falls back to the default encoder).
+# With a message queue configured, emits reach clients on every worker.
+socketio_options = {
+    'cors_allowed_origins': "*",
+    'message_queue': SOCKETIO_MESSAGE_QUEUE
+}
+if orjson is not None:
+    socketio_options['json'] = OrjsonSocketIOJSON
+socketio = SocketIO(app, **socketio_options)
 
 
 @app.context_processor
@@ -39,9 +73,52 @@ def utility_processor():
 # Configuration
 API_BASE = 'https://zebby.org/api'
 SERVICE_KEY = 'faderbank'
+_TOUCH_PAYLOAD = {
+    'service_key': SERVICE_KEY,
+    'logo_url': f'https://zebby.org/{SERVICE_KEY}/static/logo.svg'
+}
+
+# Role hierarchy and the role sets used by permission checks
+ROLE_LEVELS = {'owner': 5, 'admin': 4, 'technician': 3, 'operator': 2, 'guest': 1}
+ADMIN_ROLES = frozenset({'owner', 'admin'})
+TECH_ROLES = frozenset({'owner', 'admin', 'technician'})
+WRITE_ROLES = frozenset({'owner', 'admin', 'technician', 'operator'})
+ASSIGNABLE_ROLES = frozenset({'admin', 'technician', 'operator', 'guest'})
+
+# Slug patterns
+_SLUG_STRIP = re.compile(r'[^\w\s-]')
+_SLUG_DASH = re.compile(r'[-\s]+')
+_SLUG_VALID = re.compile(r'^[a-z0-9-]+$')
 
 # Track online users per profile room
 online_users = {}  # profile_id -> {user_id: {sid, user_info, ...}}
+online_display_names = {}  # profile_id -> {user_id: {'display_name': ...}} (wire format)
+sid_index = {}  # sid -> {(profile_id, user_id), ...}
+
+# Inbound rate limit for non-final fader and VU events, per connection
+MIN_EVENT_INTERVAL = 1 / 60  # seconds
+last_event_times = {}  # sid -> {(event, channel_id): monotonic time}
+
+# Channel -> profile lookups for socket handlers (lazily filled)
+channel_profile = {}  # channel_id -> profile_id
+
+# Coalesced fader/VU broadcasts, flushed once per window per room
+BROADCAST_WINDOW = 0.03  # seconds
+FADER_BATCH_BINARY = False  # send fader batches packed as <I count, then <IB (id, level) pairs
+pending_fader = {}  # profile_id -> {channel_id: (level, user_id, is_final, sid)}
+pending_vu = {}  # profile_id -> {channel_id: level}
+flush_scheduled = set()  # profile_ids with a flush task pending
+
+# Channel state written by socket handlers (and presence heartbeats),
+# persisted in the background: one transaction per interval, not per change
+PERSIST_INTERVAL = 0.1  # seconds
+dirty_channels = {}  # channel_id -> {'level': ..., 'mute': ..., 'solo': ...}
+dirty_lock = threading.Lock()
+persister_started = False
+
+# Expired sessions and activity rows, pruned in the background
+CLEANUP_INTERVAL = 300  # seconds
+cleanup_started = False
 
 
 # =============================================================================
@@ -49,15 +126,17 @@ online_users = {}  # profile_id -> {user_id: {sid, user_info, ...}}
 # =============================================================================
 
 def track_service_access():
-    """Track that user accessed this service."""
+    """Track that user accessed this service (without blocking the request)."""
+    socketio.start_background_task(_touch_service, dict(request.cookies))
+
+
+def _touch_service(cookies):
+    """Report service access to Zebby (runs as a background task)."""
     try:
-        requests.post(
+        zebby_http.post(
             f'{API_BASE}/services/touch',
-            json={
-                'service_key': SERVICE_KEY,
-                'logo_url': f'https://zebby.org/{SERVICE_KEY}/static/logo.svg'
-            },
-            cookies=request.cookies,
+            json=_TOUCH_PAYLOAD,
+            cookies=cookies,
             timeout=5
         )
     except Exception as e:
@@ -78,6 +157,8 @@ def require_login(f):
 
 def require_profile_access(min_role=None):
     """Decorator to require profile access with optional minimum role."""
+    min_level = ROLE_LEVELS.get(min_role, 0)
+
     def decorator(f):
         @wraps(f)
         def decorated_function(slug, *args, **kwargs):
@@ -94,10 +175,7 @@ def require_profile_access(min_role=None):
             if not role:
                 return render_template('error.html', error="You don't have access to this profile"), 403
 
-            # Role hierarchy
-            role_levels = {'owner': 5, 'admin': 4, 'technician': 3, 'operator': 2, 'guest': 1}
-
-            if min_role and role_levels.get(role, 0) < role_levels.get(min_role, 0):
+            if min_role and ROLE_LEVELS.get(role, 0) < min_level:
                 return render_template('error.html', error="Insufficient permissions"), 403
 
             return f(user=user, profile=profile, role=role, slug=slug, *args, **kwargs)
@@ -105,11 +183,122 @@ def require_profile_access(min_role=None):
     return decorator
 
 
+def channel_to_wire(channel):
+    """Reduce a channel_strip row to the fields the client uses.
+
+    vu_level comes from the live VU store; the channel_strip column is unused.
+    """
+    return {
+        'id': channel['id'],
+        'name': channel['name'],
+        'position': channel['position'],
+        'color': channel['color'],
+        'midi_cc_output': channel['midi_cc_output'],
+        'midi_cc_vu_input': channel['midi_cc_vu_input'],
+        'midi_cc_mute': channel['midi_cc_mute'],
+        'midi_cc_solo': channel['midi_cc_solo'],
+        'min_level': channel['min_level'],
+        'max_level': channel['max_level'],
+        'current_level': channel['current_level'],
+        'is_muted': bool(channel['is_muted']),
+        'is_solo': bool(channel['is_solo']),
+        'state_version': channel.get('state_version') or 0,
+        'vu_level': get_vu_levels(channel['profile_id']).get(channel['id'], 0)
+    }
+
+
+def channel_state_columns(channels):
+    """Pack channel state into parallel arrays for the wire.
+
+    Mute and solo flags are bitmasks (bit i = channels[i]) encoded as hex
+    strings so they survive JSON for any number of channels.
+    """
+    mutes = solos = 0
+    for i, c in enumerate(channels):
+        if c['is_muted']:
+            mutes |= 1 << i
+        if c['is_solo']:
+            solos |= 1 << i
+
+    return {
+        'ids': [c['id'] for c in channels],
+        'names': [c['name'] for c in channels],
+        'levels': [c['current_level'] for c in channels],
+        'versions': [c.get('state_version') or 0 for c in channels],
+        'mutes': format(mutes, 'x'),
+        'solos': format(solos, 'x')
+    }
+
+
+def _channel_profile_role(channel_id, user_id):
+    """Resolve (profile_id, role) for a socket event, from memory when possible."""
+    profile_id = channel_profile.get(channel_id)
+    if profile_id is not None:
+        return profile_id, get_user_role(profile_id, user_id)
+
+    channel_role = get_channel_profile_and_role(channel_id, user_id)
+    if channel_role:
+        channel_profile[channel_id] = channel_role[0]
+    return channel_role
+
+
+def _channel_profile_id(channel_id):
+    """Resolve a channel's profile_id for a socket event, from memory when possible."""
+    profile_id = channel_profile.get(channel_id)
+    if profile_id is None:
+        channel = get_channel_strip(channel_id)
+        if not channel:
+            return None
+        profile_id = channel_profile[channel_id] = channel['profile_id']
+    return profile_id
+
+
+def _rate_limited(event, channel_id):
+    """Return True if this connection sent the event for the channel too recently."""
+    now = time.monotonic()
+    seen = last_event_times.setdefault(request.sid, {})
+    key = (event, channel_id)
+    if now - seen.get(key, 0) < MIN_EVENT_INTERVAL:
+        return True
+    seen[key] = now
+    return False
+
+
+def forget_profile_channels(profile_id):
+    """Drop cached channel -> profile entries for a deleted profile."""
+    for channel_id in [cid for cid, pid in channel_profile.items() if pid == profile_id]:
+        channel_profile.pop(channel_id, None)
+
+
+def require_channel_write(f):
+    """Socket handler decorator: require a write role on the event's channel.
+
+    The wrapped handler receives the channel's profile_id as a keyword.
+    """
+    # Bound in the closure rather than as a default argument, which a
+    # client could override by sending extra event arguments
+    write_roles = WRITE_ROLES
+    channel_profile_role = _channel_profile_role
+
+    @wraps(f)
+    def decorated_function(data):
+        channel_id = data.get('channel_id')
+        if channel_id is None:
+            return
+
+        channel_role = channel_profile_role(channel_id, data.get('user_id'))
+        if not channel_role or channel_role[1] not in write_roles:
+            return
+
+        return f(data, profile_id=channel_role[0])
+    return decorated_function
+
+
 def slugify(text):
     """Convert text to URL-friendly slug."""
     text = text.lower().strip()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
+    text = _SLUG_STRIP.sub('', text)
+    text = _SLUG_DASH.sub('-', text)
     return text
 
 
@@ -166,13 +355,10 @@ def debug_redirect():
 def debug_db():
     """Test database connection."""
     try:
-        from config.db import get_db
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
-        cursor.close()
-        db.close()
+        from database import pooled_cursor
+        with pooled_cursor() as cursor:
+            cursor.execute("SELECT 1")
+            result = cursor.fetchone()
         return jsonify({'db_connected': True, 'result': result})
     except Exception as e:
         return jsonify({'db_connected': False, 'error': str(e)})
@@ -205,7 +391,7 @@ def new_profile(user):
             return render_template('profile_new.html', user=user,
                                    error="Name and slug are required")
 
-        if not re.match(r'^[a-z0-9-]+$', slug):
+        if not _SLUG_VALID.match(slug):
             return render_template('profile_new.html', user=user,
                                    error="Slug must contain only lowercase letters, numbers, and hyphens")
 
@@ -227,9 +413,10 @@ def new_profile(user):
 @require_profile_access()
 def view_profile(user, profile, role, slug):
     """Main profile view with canvas fader bank."""
-    channels = get_channel_strips(profile['id'])
-    resp = get_responsibility(profile['id'])
-    members = get_profile_members(profile['id'])
+    bundle = load_profile_bundle(profile['id'])
+    channels = bundle['channels']
+    resp = bundle['responsibility']
+    members = bundle['members']
 
     # Convert responsibility to JSON-safe format
     responsibility = None
@@ -254,7 +441,7 @@ def profile_config(user, profile, role, slug):
     """Profile configuration page."""
     channels = get_channel_strips(profile['id'])
     members = get_profile_members(profile['id'])
-    links = get_profile_activation_links(profile['id']) if role in ['owner', 'admin'] else []
+    links = get_profile_activation_links(profile['id']) if role in ADMIN_ROLES else []
 
     return render_template('profile_config.html',
                            user=user,
@@ -292,7 +479,7 @@ def check_slug(user):
     if not slug:
         return jsonify({'available': False, 'error': 'Slug is required'})
 
-    if not re.match(r'^[a-z0-9-]+$', slug):
+    if not _SLUG_VALID.match(slug):
         return jsonify({'available': False, 'error': 'Invalid characters'})
 
     available = is_slug_available(slug, exclude_id)
@@ -308,7 +495,7 @@ def api_update_profile(user, profile_id):
         return jsonify({'error': 'Profile not found'}), 404
 
     role = get_user_role(profile_id, user['user_id'])
-    if role not in ['owner', 'admin']:
+    if role not in ADMIN_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
@@ -335,6 +522,7 @@ def api_delete_profile(user, profile_id):
         return jsonify({'error': 'Only the owner can delete the profile'}), 403
 
     delete_profile(profile_id)
+    forget_profile_channels(profile_id)
     return jsonify({'success': True})
 
 
@@ -360,7 +548,10 @@ def api_transfer_ownership(user, profile_id):
     if not new_owner_role:
         return jsonify({'error': 'User is not a member of this profile'}), 400
 
-    transfer_ownership(profile_id, new_owner_id)
+    if not transfer_ownership(profile_id, new_owner_id):
+        # Ownership changed or the member left since the checks above
+        return jsonify({'error': 'Ownership could not be transferred'}), 409
+
     return jsonify({'success': True})
 
 
@@ -378,8 +569,10 @@ def api_get_profile_state(user, profile_id):
 
     # Record this user's activity (for online users tracking)
     update_profile_activity(profile_id, user['user_id'])
+    ensure_persister()
 
     channels = get_channel_strips(profile_id)
+    vu_levels = get_vu_levels(profile_id)
 
     # Convert to JSON-safe format (handle datetime fields)
     channel_states = []
@@ -390,7 +583,7 @@ def api_get_profile_state(user, profile_id):
             'is_muted': bool(ch['is_muted']),
             'is_solo': bool(ch['is_solo']),
             'version': ch.get('state_version') or 0,
-            'vu_level': ch.get('vu_level') or 0
+            'vu_level': vu_levels.get(ch['id'], 0)
         })
 
     # Get responsibility info
@@ -426,7 +619,7 @@ def api_update_channel_level(user, channel_id):
         return jsonify({'error': 'Channel not found'}), 404
 
     role = get_user_role(channel['profile_id'], user['user_id'])
-    if role not in ['owner', 'admin', 'technician', 'operator']:
+    if role not in WRITE_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json() or {}
@@ -435,11 +628,7 @@ def api_update_channel_level(user, channel_id):
     # Clamp to valid range
     level = max(0, min(127, int(level)))
 
-    update_fader_level(channel_id, level)
-
-    # Get the new version to return to client
-    updated = get_channel_strip(channel_id)
-    new_version = updated.get('state_version') or 0
+    new_version = update_fader_level(channel_id, level)
 
     return jsonify({'success': True, 'version': new_version})
 
@@ -453,17 +642,13 @@ def api_toggle_channel_mute(user, channel_id):
         return jsonify({'error': 'Channel not found'}), 404
 
     role = get_user_role(channel['profile_id'], user['user_id'])
-    if role not in ['owner', 'admin', 'technician', 'operator']:
+    if role not in WRITE_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json() or {}
     is_muted = data.get('is_muted', not channel['is_muted'])
 
-    update_mute_state(channel_id, is_muted)
-
-    # Get the new version to return to client
-    updated = get_channel_strip(channel_id)
-    new_version = updated.get('state_version') or 0
+    new_version = update_mute_state(channel_id, is_muted)
 
     return jsonify({'success': True, 'is_muted': is_muted, 'version': new_version})
 
@@ -477,17 +662,13 @@ def api_toggle_channel_solo(user, channel_id):
         return jsonify({'error': 'Channel not found'}), 404
 
     role = get_user_role(channel['profile_id'], user['user_id'])
-    if role not in ['owner', 'admin', 'technician', 'operator']:
+    if role not in WRITE_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json() or {}
     is_solo = data.get('is_solo', not channel['is_solo'])
 
-    update_solo_state(channel_id, is_solo)
-
-    # Get the new version to return to client
-    updated = get_channel_strip(channel_id)
-    new_version = updated.get('state_version') or 0
+    new_version = update_solo_state(channel_id, is_solo)
 
     return jsonify({'success': True, 'is_solo': is_solo, 'version': new_version})
 
@@ -505,7 +686,7 @@ def api_update_vu_levels(user, profile_id):
 
     if vu_data:
         # Convert string keys to int if needed
-        vu_dict = {int(k): v for k, v in vu_data.items()}
+        vu_dict = {int(k): max(0, min(127, int(v))) for k, v in vu_data.items()}
         update_vu_levels_bulk(profile_id, vu_dict)
 
     return jsonify({'success': True})
@@ -516,7 +697,7 @@ def api_update_vu_levels(user, profile_id):
 def api_take_responsibility(user, profile_id):
     """Take responsibility for a profile."""
     role = get_user_role(profile_id, user['user_id'])
-    if role not in ['owner', 'admin', 'technician', 'operator']:
+    if role not in WRITE_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     force = request.args.get('force') == '1'
@@ -552,7 +733,7 @@ def api_drop_responsibility(user, profile_id):
 def api_create_channel(user, profile_id):
     """Create a new channel strip."""
     role = get_user_role(profile_id, user['user_id'])
-    if role not in ['owner', 'admin', 'technician']:
+    if role not in TECH_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json() or {}
@@ -573,11 +754,12 @@ def api_create_channel(user, profile_id):
         min_level=data.get('min_level', 0),
         max_level=data.get('max_level', 127)
     )
+    channel_profile[channel_id] = profile_id
 
     # Notify all users in the room (non-fatal if it fails under mod_wsgi)
     try:
         channel = get_channel_strip(channel_id)
-        socketio.emit('channel_added', {'channel': dict(channel)}, room=f'profile_{profile_id}')
+        socketio.emit('channel_added', {'channel': channel_to_wire(channel)}, room=f'profile_{profile_id}')
     except Exception as e:
         logging.warning(f"Failed to emit channel_added: {e}")
 
@@ -593,7 +775,7 @@ def api_update_channel(user, channel_id):
         return jsonify({'error': 'Channel not found'}), 404
 
     role = get_user_role(channel['profile_id'], user['user_id'])
-    if role not in ['owner', 'admin', 'technician']:
+    if role not in TECH_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
@@ -614,7 +796,7 @@ def api_update_channel(user, channel_id):
 
     # Notify all users (non-fatal if it fails under mod_wsgi)
     try:
-        socketio.emit('channel_updated', {'channel': dict(updated_channel)},
+        socketio.emit('channel_updated', {'channel': channel_to_wire(updated_channel)},
                       room=f'profile_{channel["profile_id"]}')
     except Exception as e:
         logging.warning(f"Failed to emit channel_updated: {e}")
@@ -631,11 +813,12 @@ def api_delete_channel(user, channel_id):
         return jsonify({'error': 'Channel not found'}), 404
 
     role = get_user_role(channel['profile_id'], user['user_id'])
-    if role not in ['owner', 'admin', 'technician']:
+    if role not in TECH_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     profile_id = channel['profile_id']
     delete_channel_strip(channel_id)
+    channel_profile.pop(channel_id, None)
 
     # Notify all users (non-fatal if it fails under mod_wsgi)
     try:
@@ -651,7 +834,7 @@ def api_delete_channel(user, channel_id):
 def api_reorder_channels(user, profile_id):
     """Reorder channel strips."""
     role = get_user_role(profile_id, user['user_id'])
-    if role not in ['owner', 'admin', 'technician']:
+    if role not in TECH_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
@@ -681,7 +864,7 @@ def api_update_member_role(user, profile_id, member_user_id):
         return jsonify({'error': 'Profile not found'}), 404
 
     my_role = get_user_role(profile_id, user['user_id'])
-    if my_role not in ['owner', 'admin']:
+    if my_role not in ADMIN_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     # Can't change owner's role
@@ -696,7 +879,7 @@ def api_update_member_role(user, profile_id, member_user_id):
     data = request.get_json()
     new_role = data.get('role')
 
-    if new_role not in ['admin', 'technician', 'operator', 'guest']:
+    if new_role not in ASSIGNABLE_ROLES:
         return jsonify({'error': 'Invalid role'}), 400
 
     # Admins can't promote to admin
@@ -726,7 +909,7 @@ def api_remove_member(user, profile_id, member_user_id):
         return jsonify({'error': 'Profile not found'}), 404
 
     my_role = get_user_role(profile_id, user['user_id'])
-    if my_role not in ['owner', 'admin']:
+    if my_role not in ADMIN_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     # Can't remove owner
@@ -758,13 +941,13 @@ def api_remove_member(user, profile_id, member_user_id):
 def api_create_invite(user, profile_id):
     """Create an activation link."""
     role = get_user_role(profile_id, user['user_id'])
-    if role not in ['owner', 'admin']:
+    if role not in ADMIN_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     data = request.get_json()
     invite_role = data.get('role', 'guest')
 
-    if invite_role not in ['admin', 'technician', 'operator', 'guest']:
+    if invite_role not in ASSIGNABLE_ROLES:
         return jsonify({'error': 'Invalid role'}), 400
 
     # Admins can't create admin invites
@@ -781,22 +964,16 @@ def api_create_invite(user, profile_id):
 @require_login
 def api_cancel_invite(user, link_id):
     """Cancel an activation link."""
-    from database import get_db
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    from database import pooled_cursor
+    with pooled_cursor() as cursor:
         cursor.execute("SELECT * FROM activation_link WHERE id = %s", (link_id,))
         link = cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
 
     if not link:
         return jsonify({'error': 'Link not found'}), 404
 
     role = get_user_role(link['profile_id'], user['user_id'])
-    if role not in ['owner', 'admin']:
+    if role not in ADMIN_ROLES:
         return jsonify({'error': 'Insufficient permissions'}), 403
 
     cancel_activation_link(link_id, link['profile_id'])
@@ -851,33 +1028,43 @@ def redeem_invite(token):
 @socketio.on('connect')
 def handle_connect():
     """Handle WebSocket connection."""
-    pass
+    global cleanup_started
+
+    if not cleanup_started:
+        cleanup_started = True
+        socketio.start_background_task(_cleanup_loop)
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection."""
     sid = request.sid
+    last_event_times.pop(sid, None)
 
     # Remove user from all rooms they were in
-    for profile_id, users in list(online_users.items()):
-        for user_id, data in list(users.items()):
-            if data.get('sid') == sid:
-                del online_users[profile_id][user_id]
-
-                # Notify room
-                emit('user_left', {
-                    'user_id': user_id
-                }, room=f'profile_{profile_id}')
-
-                # If they had responsibility, clear it
-                resp = get_responsibility(profile_id)
-                if resp and resp['user_id'] == user_id:
-                    drop_responsibility(profile_id, user_id)
-                    emit('responsibility_changed', {
-                        'user_id': None,
-                        'display_name': None
-                    }, room=f'profile_{profile_id}')
+    left = []
+    for profile_id, user_id in sid_index.pop(sid, ()):
+        users = online_users.get(profile_id, {})
+        data = users.get(user_id)
+        if not data or data.get('sid') != sid:
+            # User has since rejoined from another connection
+            continue
+
+        del users[user_id]
+        online_display_names.get(profile_id, {}).pop(user_id, None)
+
+        # Notify room
+        emit('user_left', {
+            'user_id': user_id
+        }, room=f'profile_{profile_id}')
+        left.append((profile_id, user_id))
+
+    # If they had responsibility anywhere, clear it in one statement
+    for profile_id in drop_responsibility_bulk(left):
+        emit('responsibility_changed', {
+            'user_id': None,
+            'display_name': None
+        }, room=f'profile_{profile_id}')
 
 
 @socketio.on('join_profile')
@@ -902,10 +1089,24 @@ def handle_join_profile(data):
         'display_name': display_name,
         'joined_at': datetime.now().isoformat()
     }
+    online_display_names.setdefault(profile_id, {})[user_id] = {'display_name': display_name}
+    sid_index.setdefault(request.sid, set()).add((profile_id, user_id))
+
+    # Send online users, channel state and responsibility to the joining
+    # user as a single message
+    channels = get_channel_strips(profile_id)
+    resp = get_responsibility(profile_id)
+    responsibility = None
+    if resp:
+        responsibility = {
+            'user_id': resp['user_id'],
+            'display_name': resp['display_name']
+        }
 
-    # Send current online users to the joining user
-    emit('online_users', {
-        'users': {uid: {'display_name': d['display_name']} for uid, d in online_users[profile_id].items()}
+    emit('join_snapshot', {
+        'online_users': online_display_names[profile_id],
+        'channels': channel_state_columns(channels),
+        'responsibility': responsibility
     })
 
     # Notify room of new user
@@ -914,17 +1115,6 @@ def handle_join_profile(data):
         'display_name': display_name
     }, room=room, include_self=False)
 
-    # Send current state
-    channels = get_channel_strips(profile_id)
-    emit('channel_state', {'channels': [dict(c) for c in channels]})
-
-    responsibility = get_responsibility(profile_id)
-    if responsibility:
-        emit('responsibility_changed', {
-            'user_id': responsibility['user_id'],
-            'display_name': responsibility['display_name']
-        })
-
 
 @socketio.on('leave_profile')
 def handle_leave_profile(data):
@@ -941,12 +1131,20 @@ def handle_leave_profile(data):
     # Remove from tracking
     if profile_id in online_users and user_id in online_users[profile_id]:
         del online_users[profile_id][user_id]
+    online_display_names.get(profile_id, {}).pop(user_id, None)
+
+    joined = sid_index.get(request.sid)
+    if joined is not None:
+        joined.discard((profile_id, user_id))
+        if not joined:
+            del sid_index[request.sid]
 
     emit('user_left', {'user_id': user_id}, room=room)
 
 
 @socketio.on('fader_change')
-def handle_fader_change(data):
+@require_channel_write
+def handle_fader_change(data, profile_id):
     """Handle fader level change."""
     channel_id = data.get('channel_id')
     level = data.get('level')
@@ -956,29 +1154,31 @@ def handle_fader_change(data):
     if channel_id is None or level is None:
         return
 
-    channel = get_channel_strip(channel_id)
-    if not channel:
+    # The dirty buffer is shared by every room; never let a bad value into it
+    try:
+        level = max(0, min(127, int(level)))
+    except (TypeError, ValueError):
         return
 
-    # Check permission
-    role = get_user_role(channel['profile_id'], user_id)
-    if role not in ['owner', 'admin', 'technician', 'operator']:
+    if not is_final and _rate_limited('fader', channel_id):
         return
 
-    # Update database
-    update_fader_level(channel_id, level)
+    # Buffer the write; only the final position of a drag is persisted inline
+    mark_channel_dirty(channel_id, 'level', level)
+    if is_final:
+        try:
+            persist_dirty_channels()
+        except Exception as e:
+            logging.error(f"Failed to persist channel state: {e}")
 
-    # Broadcast to room
-    emit('fader_update', {
-        'channel_id': channel_id,
-        'level': level,
-        'user_id': user_id,
-        'is_final': is_final
-    }, room=f'profile_{channel["profile_id"]}', include_self=False)
+    # Queue for the next batched flush (last write wins per channel)
+    pending_fader.setdefault(profile_id, {})[channel_id] = (level, user_id, is_final, request.sid)
+    _schedule_flush(profile_id)
 
 
 @socketio.on('mute_toggle')
-def handle_mute_toggle(data):
+@require_channel_write
+def handle_mute_toggle(data, profile_id):
     """Handle mute button toggle."""
     channel_id = data.get('channel_id')
     is_muted = data.get('is_muted')
@@ -986,29 +1186,22 @@ def handle_mute_toggle(data):
 
     if channel_id is None or is_muted is None:
         return
+    is_muted = bool(is_muted)
 
-    channel = get_channel_strip(channel_id)
-    if not channel:
-        return
-
-    # Check permission
-    role = get_user_role(channel['profile_id'], user_id)
-    if role not in ['owner', 'admin', 'technician', 'operator']:
-        return
-
-    # Update database
-    update_mute_state(channel_id, is_muted)
+    # Buffer the write for the background persister
+    mark_channel_dirty(channel_id, 'mute', is_muted)
 
     # Broadcast to room
     emit('mute_update', {
         'channel_id': channel_id,
         'is_muted': is_muted,
         'user_id': user_id
-    }, room=f'profile_{channel["profile_id"]}', include_self=False)
+    }, room=f'profile_{profile_id}', include_self=False)
 
 
 @socketio.on('solo_toggle')
-def handle_solo_toggle(data):
+@require_channel_write
+def handle_solo_toggle(data, profile_id):
     """Handle solo button toggle."""
     channel_id = data.get('channel_id')
     is_solo = data.get('is_solo')
@@ -1016,25 +1209,17 @@ def handle_solo_toggle(data):
 
     if channel_id is None or is_solo is None:
         return
+    is_solo = bool(is_solo)
 
-    channel = get_channel_strip(channel_id)
-    if not channel:
-        return
-
-    # Check permission
-    role = get_user_role(channel['profile_id'], user_id)
-    if role not in ['owner', 'admin', 'technician', 'operator']:
-        return
-
-    # Update database
-    update_solo_state(channel_id, is_solo)
+    # Buffer the write for the background persister
+    mark_channel_dirty(channel_id, 'solo', is_solo)
 
     # Broadcast to room
     emit('solo_update', {
         'channel_id': channel_id,
         'is_solo': is_solo,
         'user_id': user_id
-    }, room=f'profile_{channel["profile_id"]}', include_self=False)
+    }, room=f'profile_{profile_id}', include_self=False)
 
 
 @socketio.on('vu_level')
@@ -1046,15 +1231,128 @@ def handle_vu_level(data):
     if channel_id is None or level is None:
         return
 
-    channel = get_channel_strip(channel_id)
-    if not channel:
+    if _rate_limited('vu', channel_id):
         return
 
-    # Broadcast to room (no permission check - VU is input only)
-    emit('vu_update', {
-        'channel_id': channel_id,
-        'level': level
-    }, room=f'profile_{channel["profile_id"]}', include_self=False)
+    # No permission check - VU is input only, so only the room is needed
+    profile_id = _channel_profile_id(channel_id)
+    if profile_id is None:
+        return
+
+    # Queue for the next batched flush
+    pending_vu.setdefault(profile_id, {})[channel_id] = level
+    _schedule_flush(profile_id)
+
+
+def _schedule_flush(profile_id):
+    """Start a flush task for a room unless one is already pending."""
+    if profile_id not in flush_scheduled:
+        flush_scheduled.add(profile_id)
+        socketio.start_background_task(_flush_updates, profile_id)
+
+
+def _flush_updates(profile_id):
+    """Persist and broadcast the fader/VU updates collected during one window."""
+    socketio.sleep(BROADCAST_WINDOW)
+    flush_scheduled.discard(profile_id)
+    faders = pending_fader.pop(profile_id, {})
+    vu_levels = pending_vu.pop(profile_id, {})
+    room = f'profile_{profile_id}'
+
+    if faders:
+        # Don't echo a batch back to its only sender. This only saves
+        # traffic: multi-sender batches reach everyone, and each client skips
+        # the fader it is dragging (applyFaderUpdates)
+        sids = {entry[3] for entry in faders.values()}
+        skip_sid = sids.pop() if len(sids) == 1 else None
+
+        if FADER_BATCH_BINARY:
+            packed = []
+            for channel_id, entry in faders.items():
+                packed.extend((channel_id, max(0, min(127, int(entry[0])))))
+            payload = struct.pack('<I' + 'IB' * len(faders), len(faders), *packed)
+            socketio.emit('fader_update_batch_bin', payload, room=room, skip_sid=skip_sid)
+        else:
+            socketio.emit('fader_update_batch', {
+                'updates': [{
+                    'channel_id': channel_id,
+                    'level': level,
+                    'user_id': user_id,
+                    'is_final': is_final
+                } for channel_id, (level, user_id, is_final, sid) in faders.items()]
+            }, room=room, skip_sid=skip_sid)
+
+    if vu_levels:
+        try:
+            update_vu_levels_bulk(profile_id, vu_levels)
+        except Exception as e:
+            logging.error(f"Failed to store VU levels: {e}")
+        socketio.emit('vu_update_batch', {
+            'updates': [{'channel_id': cid, 'level': lvl} for cid, lvl in vu_levels.items()]
+        }, room=room)
+
+
+def mark_channel_dirty(channel_id, field, value):
+    """Record the latest value of a channel field for the background persister."""
+    with dirty_lock:
+        dirty_channels.setdefault(channel_id, {})[field] = value
+
+    ensure_persister()
+
+
+def ensure_persister():
+    """Start the background persister if it isn't running yet."""
+    global persister_started
+
+    if not persister_started:
+        persister_started = True
+        socketio.start_background_task(_persist_loop)
+
+
+def persist_dirty_channels():
+    """Write all buffered channel state to the database in one batch."""
+    with dirty_lock:
+        batch = dict(dirty_channels)
+        dirty_channels.clear()
+
+    if batch:
+        try:
+            bulk_update_channel_state([
+                (state.get('level'), state.get('mute'), state.get('solo'), channel_id)
+                for channel_id, state in batch.items()
+            ])
+        except Exception:
+            # Put the batch back for the next attempt; values buffered since
+            # the swap are newer and win
+            with dirty_lock:
+                for channel_id, state in batch.items():
+                    dirty_channels[channel_id] = {**state, **dirty_channels.get(channel_id, {})}
+            raise
+
+
+def _persist_loop():
+    """Background task that periodically persists buffered channel state and heartbeats."""
+    while True:
+        socketio.sleep(PERSIST_INTERVAL)
+        try:
+            persist_dirty_channels()
+        except Exception as e:
+            logging.error(f"Failed to persist channel state: {e}")
+        try:
+            flush_profile_activity()
+        except Exception as e:
+            logging.error(f"Failed to persist profile activity: {e}")
+
+
+def _cleanup_loop():
+    """Background task that periodically prunes expired sessions and activity."""
+    while True:
+        socketio.sleep(CLEANUP_INTERVAL)
+        try:
+            cleanup_old_sessions()
+            cleanup_old_activity()
+        except Exception as e:
+            logging.error(f"Cleanup failed: {e}")
 
 
 @socketio.on('take_responsibility')
@@ -1070,7 +1368,7 @@ def handle_take_responsibility(data):
 
     # Check permission
     role = get_user_role(profile_id, user_id)
-    if role not in ['owner', 'admin', 'technician', 'operator']:
+    if role not in WRITE_ROLES:
         return
 
     current = get_responsibility(profile_id)
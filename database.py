@@ -1,53 +1,231 @@
 """Database operations and authentication helpers for Zebby Faderbank."""
 
 import requests
+import hashlib
 import secrets
-import json
 import logging
+import ormsgpack
+import queue
+import threading
+import time
+import pymysql.cursors
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from flask import request
+from http.cookiejar import DefaultCookiePolicy
+from cachetools import TTLCache
+from flask import g, has_request_context, request
+from requests.adapters import HTTPAdapter
 from config.db import get_db
 
+# Keep-alive connections to the Zebby API. The session is shared between
+# users, so it must never store cookies from responses.
+zebby_http = requests.Session()
+zebby_http.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20))
+zebby_http.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+ZEBBY_TIMEOUT = (1.0, 2.0)  # (connect, read) seconds
+
+# Users, profiles and roles are read on nearly every request and socket
+# event; cache them briefly in-process and invalidate on changes.
+_role_cache = TTLCache(maxsize=10000, ttl=30)  # (profile_id, user_id) -> role
+_user_cache = TTLCache(maxsize=10000, ttl=30)  # user_id -> row
+_profile_cache = TTLCache(maxsize=10000, ttl=30)  # profile_id -> row
+_profile_slug_cache = TTLCache(maxsize=10000, ttl=30)  # slug -> row
+_zebby_info_cache = TTLCache(maxsize=5000, ttl=15)  # sha256(session cookie) -> user info
+_cache_lock = threading.RLock()
+
+
+# =============================================================================
+# Connection Pool
+# =============================================================================
+
+try:
+    from config.db import POOL_SIZE
+except ImportError:
+    POOL_SIZE = 25
+
+# Idle connections older than this are pinged (and reconnected if needed)
+# before reuse; fresher ones are handed out without a round-trip.
+POOL_PING_AFTER = 30  # seconds
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)  # (connection, released_at)
+
+
+def _acquire_db():
+    """Check a connection out of the pool, opening a new one if none are idle."""
+    try:
+        db, released_at = _pool.get_nowait()
+    except queue.Empty:
+        return get_db()
+
+    if time.monotonic() - released_at > POOL_PING_AFTER:
+        try:
+            db.ping(reconnect=True)
+        except Exception:
+            db = get_db()
+    return db
+
+
+def _release_db(db):
+    """Return a connection to the pool, closing it if the pool is full."""
+    try:
+        _pool.put_nowait((db, time.monotonic()))
+    except queue.Full:
+        db.close()
+
+
+class RequestCachedCursor(pymysql.cursors.DictCursor):
+    """DictCursor that memoizes plain SELECTs for the rest of the request.
+
+    Identical queries issued while handling one request (a helper called
+    once per rendered row, say) hit the database once. Any other statement
+    clears the request's cache, so reads after a write see the write.
+    Only writes made in the same request are seen this way: writes from the
+    persister or other background threads don't clear it, so a cached read
+    can miss them until the request ends. Outside a request context it
+    behaves like a DictCursor.
+    """
+
+    def execute(self, query, args=None):
+        if not has_request_context():
+            return super().execute(query, args)
+
+        cache = g.setdefault('query_cache', {})
+        statement = query.lstrip()[:6].upper()
+        if statement != 'SELECT' or ';' in query or 'FOR UPDATE' in query.upper():
+            cache.clear()
+            return super().execute(query, args)
+
+        key = self.mogrify(query, args)
+        hit = cache.get(key)
+        if hit is None:
+            result = super().execute(query, args)
+            cache[key] = (self.description, [dict(row) for row in self._rows or ()])
+            return result
+
+        # Fake what Cursor.execute() leaves behind so fetch*() accepts it
+        self._executed = key
+        self.description, rows = hit
+        self._rows = [dict(row) for row in rows]
+        self.rownumber = 0
+        self.rowcount = len(rows)
+        return self.rowcount
+
+
+@contextmanager
+def pooled_cursor(cursorclass=RequestCachedCursor):
+    """Yield a cursor on a pooled connection.
+
+    Commits when the block exits cleanly and rolls back if it raises (or,
+    for generators that stream from the cursor, if they are abandoned).
+    """
+    db = _acquire_db()
+    cursor = db.cursor(cursorclass)
+
+    try:
+        yield cursor
+        db.commit()
+    except BaseException:
+        try:
+            db.rollback()
+        except Exception:
+            # Connection is unusable; drop it instead of returning it to the pool
+            db = None
+        raise
+    finally:
+        cursor.close()
+        if db is not None:
+            _release_db(db)
+
+
+# =============================================================================
+# Redis (optional)
+# =============================================================================
+
+# Ephemeral state (VU levels, presence) lives in Redis when REDIS_URL is set
+try:
+    from config.db import REDIS_URL
+except ImportError:
+    REDIS_URL = None
+
+if REDIS_URL:
+    import redis
+    _redis = redis.Redis(
+        connection_pool=redis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=20)
+    )
+else:
+    _redis = None
+
 
 # =============================================================================
 # Zebby Authentication
 # =============================================================================
 
 def get_zebby_user_info():
-    """Get user info from Zebby API. Returns None if not logged in."""
+    """Get user info from Zebby API. Returns None if not logged in.
+
+    Memoized for the rest of the request on flask.g, and across requests
+    for a few seconds per session cookie.
+    """
+    if 'zebby_user' in g:
+        return g.zebby_user
+
+    g.zebby_user = _fetch_zebby_user_info()
+    return g.zebby_user
+
+
+def _fetch_zebby_user_info():
     zebby_session = request.cookies.get('zebby_session')
 
     if not zebby_session:
         return None
 
+    key = hashlib.sha256(zebby_session.encode()).digest()
+    with _cache_lock:
+        user_data = _zebby_info_cache.get(key)
+    if user_data is not None:
+        return user_data
+
     try:
-        response = requests.get(
+        response = zebby_http.get(
             'https://zebby.org/api/user/info',
-            cookies={'zebby_session': zebby_session}
+            cookies={'zebby_session': zebby_session},
+            timeout=ZEBBY_TIMEOUT
         )
 
         if response.status_code != 200:
             return None
 
         user_data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        logging.warning(f"Zebby user info lookup failed: {e}")
+        return None
 
-        # Sync user to local database (non-fatal if it fails)
-        try:
-            sync_user(user_data)
-        except Exception as e:
-            logging.error(f"Failed to sync user to database: {e}")
+    with _cache_lock:
+        _zebby_info_cache[key] = user_data
 
-        return user_data
-    except:
-        return None
+    # Sync user to local database (non-fatal if it fails). Users we have
+    # already loaded are synced off the auth path; anyone else may be brand
+    # new, and the rows that reference them need the user row to exist first.
+    with _cache_lock:
+        known = user_data.get('user_id') in _user_cache
+    if known:
+        threading.Thread(target=_sync_user_quietly, args=(user_data,), daemon=True).start()
+    else:
+        _sync_user_quietly(user_data)
 
+    return user_data
 
-def sync_user(user_data):
-    """Sync Zebby user data to local database."""
-    db = get_db()
-    cursor = db.cursor()
 
+def _sync_user_quietly(user_data):
     try:
+        sync_user(user_data)
+    except Exception as e:
+        logging.error(f"Failed to sync user to database: {e}")
+
+
+def sync_user(user_data):
+    """Sync Zebby user data to local database."""
+    with pooled_cursor() as cursor:
         cursor.execute(
             """INSERT INTO user (id, username, display_name, last_active_at, created_at)
                VALUES (%s, %s, %s, NOW(), NOW())
@@ -57,23 +235,26 @@ def sync_user(user_data):
                    last_active_at = NOW()""",
             (user_data['user_id'], user_data.get('username'), user_data.get('display_name'))
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+    with _cache_lock:
+        _user_cache.pop(user_data['user_id'], None)
 
 
 def get_user_by_id(user_id):
     """Get user from local database."""
-    db = get_db()
-    cursor = db.cursor()
+    with _cache_lock:
+        user = _user_cache.get(user_id)
+    if user is not None:
+        return user
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute("SELECT * FROM user WHERE id = %s", (user_id,))
-        return cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
+        user = cursor.fetchone()
+
+    if user is not None:
+        with _cache_lock:
+            _user_cache[user_id] = user
+    return user
 
 
 # =============================================================================
@@ -82,10 +263,7 @@ def get_user_by_id(user_id):
 
 def create_profile(name, slug, owner_id):
     """Create a new profile and add owner as member."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         # Create profile
         cursor.execute(
             """INSERT INTO profile (name, slug, owner_id)
@@ -108,48 +286,55 @@ def create_profile(name, slug, owner_id):
             (profile_id,)
         )
 
-        db.commit()
-        return profile_id
-    except Exception as e:
-        db.rollback()
-        raise e
-    finally:
-        cursor.close()
-        db.close()
+    invalidate_user_role(profile_id)
+    return profile_id
 
 
 def get_profile_by_id(profile_id):
     """Get profile by ID."""
-    db = get_db()
-    cursor = db.cursor()
+    with _cache_lock:
+        profile = _profile_cache.get(profile_id)
+    if profile is not None:
+        return profile
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute("SELECT * FROM profile WHERE id = %s", (profile_id,))
-        return cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
+        profile = cursor.fetchone()
+
+    if profile is not None:
+        with _cache_lock:
+            _profile_cache[profile_id] = profile
+    return profile
 
 
 def get_profile_by_slug(slug):
     """Get profile by slug."""
-    db = get_db()
-    cursor = db.cursor()
+    with _cache_lock:
+        profile = _profile_slug_cache.get(slug)
+    if profile is not None:
+        return profile
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute("SELECT * FROM profile WHERE slug = %s", (slug,))
-        return cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
+        profile = cursor.fetchone()
+
+    if profile is not None:
+        with _cache_lock:
+            _profile_slug_cache[slug] = profile
+    return profile
+
+
+def invalidate_profile(profile_id):
+    """Drop cached rows for a profile (by id and by any slug)."""
+    with _cache_lock:
+        _profile_cache.pop(profile_id, None)
+        for slug in [k for k, v in _profile_slug_cache.items() if v['id'] == profile_id]:
+            _profile_slug_cache.pop(slug, None)
 
 
 def is_slug_available(slug, exclude_profile_id=None):
     """Check if a slug is available."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         if exclude_profile_id:
             cursor.execute(
                 "SELECT id FROM profile WHERE slug = %s AND id != %s",
@@ -158,17 +343,11 @@ def is_slug_available(slug, exclude_profile_id=None):
         else:
             cursor.execute("SELECT id FROM profile WHERE slug = %s", (slug,))
         return cursor.fetchone() is None
-    finally:
-        cursor.close()
-        db.close()
 
 
 def update_profile(profile_id, name=None, slug=None):
     """Update profile details."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         updates = []
         params = []
 
@@ -185,31 +364,22 @@ def update_profile(profile_id, name=None, slug=None):
                 f"UPDATE profile SET {', '.join(updates)} WHERE id = %s",
                 params
             )
-            db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+    invalidate_profile(profile_id)
 
 
 def delete_profile(profile_id):
     """Delete a profile (cascades to members, channels, etc.)."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute("DELETE FROM profile WHERE id = %s", (profile_id,))
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+    invalidate_profile(profile_id)
+    invalidate_user_role(profile_id)
 
 
 def get_user_profiles(user_id):
     """Get all profiles a user has access to."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """SELECT p.*, pm.role
                FROM profile p
@@ -219,9 +389,6 @@ def get_user_profiles(user_id):
             (user_id,)
         )
         return cursor.fetchall()
-    finally:
-        cursor.close()
-        db.close()
 
 
 # =============================================================================
@@ -230,127 +397,116 @@ def get_user_profiles(user_id):
 
 def get_user_role(profile_id, user_id):
     """Get user's role in a profile. Returns None if not a member."""
-    db = get_db()
-    cursor = db.cursor()
+    key = (profile_id, user_id)
+    with _cache_lock:
+        if key in _role_cache:
+            return _role_cache[key]
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """SELECT role FROM profile_member
                WHERE profile_id = %s AND user_id = %s""",
             (profile_id, user_id)
         )
         result = cursor.fetchone()
-        return result['role'] if result else None
-    finally:
-        cursor.close()
-        db.close()
+        role = result['role'] if result else None
 
+    with _cache_lock:
+        _role_cache[key] = role
+    return role
 
-def get_profile_members(profile_id):
-    """Get all members of a profile."""
-    db = get_db()
-    cursor = db.cursor()
 
-    try:
-        cursor.execute(
-            """SELECT pm.*, u.username, u.display_name
-               FROM profile_member pm
-               JOIN user u ON pm.user_id = u.id
-               WHERE pm.profile_id = %s
-               ORDER BY FIELD(pm.role, 'owner', 'admin', 'technician', 'operator', 'guest'), u.display_name""",
-            (profile_id,)
-        )
+def invalidate_user_role(profile_id, user_id=None):
+    """Drop cached roles for one member, or for every member of a profile."""
+    with _cache_lock:
+        if user_id is not None:
+            _role_cache.pop((profile_id, user_id), None)
+        else:
+            for key in [k for k in _role_cache.keys() if k[0] == profile_id]:
+                _role_cache.pop(key, None)
+
+
+_MEMBERS_SQL = """SELECT pm.*, u.username, u.display_name
+                  FROM profile_member pm
+                  JOIN user u ON pm.user_id = u.id
+                  WHERE pm.profile_id = %s
+                  ORDER BY FIELD(pm.role, 'owner', 'admin', 'technician', 'operator', 'guest'), u.display_name"""
+
+
+def get_profile_members(profile_id, limit=None, offset=0):
+    """Get members of a profile, optionally one page at a time."""
+    sql = _MEMBERS_SQL
+    params = [profile_id]
+    if limit is not None:
+        sql += " LIMIT %s OFFSET %s"
+        params += [limit, offset]
+
+    with pooled_cursor() as cursor:
+        cursor.execute(sql, params)
         return cursor.fetchall()
-    finally:
-        cursor.close()
-        db.close()
 
 
 def add_profile_member(profile_id, user_id, role, added_by):
     """Add a user as a member of a profile."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """INSERT INTO profile_member (profile_id, user_id, role, added_by)
                VALUES (%s, %s, %s, %s)""",
             (profile_id, user_id, role, added_by)
         )
-        db.commit()
-        return cursor.lastrowid
-    finally:
-        cursor.close()
-        db.close()
+        member_id = cursor.lastrowid
+
+    invalidate_user_role(profile_id, user_id)
+    return member_id
 
 
 def update_member_role(profile_id, user_id, new_role):
     """Update a member's role."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """UPDATE profile_member SET role = %s
                WHERE profile_id = %s AND user_id = %s""",
             (new_role, profile_id, user_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+    invalidate_user_role(profile_id, user_id)
 
 
 def remove_profile_member(profile_id, user_id):
     """Remove a user from a profile."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """DELETE FROM profile_member
                WHERE profile_id = %s AND user_id = %s""",
             (profile_id, user_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
 
+    invalidate_user_role(profile_id, user_id)
 
-def transfer_ownership(profile_id, new_owner_id):
-    """Transfer profile ownership to another user."""
-    db = get_db()
-    cursor = db.cursor()
 
-    try:
-        # Get current owner
-        cursor.execute("SELECT owner_id FROM profile WHERE id = %s", (profile_id,))
-        profile = cursor.fetchone()
-        old_owner_id = profile['owner_id']
+def transfer_ownership(profile_id, new_owner_id):
+    """Transfer profile ownership to another user.
 
-        # Update profile owner
+    The owner change and both role swaps happen in a single statement, so
+    there is no window where the profile has two owners or none. Returns
+    False if the new owner is not a member or already owns the profile.
+    """
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "UPDATE profile SET owner_id = %s WHERE id = %s",
-            (new_owner_id, profile_id)
+            """UPDATE profile p
+               JOIN profile_member old_m
+                 ON old_m.profile_id = p.id AND old_m.user_id = p.owner_id
+               JOIN profile_member new_m
+                 ON new_m.profile_id = p.id AND new_m.user_id = %s
+               SET p.owner_id = %s, old_m.role = 'admin', new_m.role = 'owner'
+               WHERE p.id = %s AND p.owner_id != %s""",
+            (new_owner_id, new_owner_id, profile_id, new_owner_id)
         )
+        transferred = cursor.rowcount > 0
 
-        # Update roles
-        cursor.execute(
-            """UPDATE profile_member SET role = 'admin'
-               WHERE profile_id = %s AND user_id = %s""",
-            (profile_id, old_owner_id)
-        )
-        cursor.execute(
-            """UPDATE profile_member SET role = 'owner'
-               WHERE profile_id = %s AND user_id = %s""",
-            (profile_id, new_owner_id)
-        )
-
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+    invalidate_profile(profile_id)
+    invalidate_user_role(profile_id)
+    return transferred
 
 
 # =============================================================================
@@ -359,31 +515,21 @@ def transfer_ownership(profile_id, new_owner_id):
 
 def create_activation_link(profile_id, role, created_by):
     """Create a single-use activation link."""
-    db = get_db()
-    cursor = db.cursor()
-
     token = secrets.token_urlsafe(32)
     expires_at = datetime.now() + timedelta(days=7)
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """INSERT INTO activation_link (profile_id, token, role, created_by, expires_at)
                VALUES (%s, %s, %s, %s, %s)""",
             (profile_id, token, role, created_by, expires_at)
         )
-        db.commit()
         return token
-    finally:
-        cursor.close()
-        db.close()
 
 
 def get_activation_link(token):
     """Get activation link by token."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """SELECT al.*, p.name as profile_name, p.slug as profile_slug
                FROM activation_link al
@@ -392,9 +538,6 @@ def get_activation_link(token):
             (token,)
         )
         return cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
 
 
 def is_activation_link_valid(link):
@@ -411,119 +554,141 @@ def is_activation_link_valid(link):
 
 
 def redeem_activation_link(token, user_id):
-    """Redeem an activation link for a user."""
-    db = get_db()
-    cursor = db.cursor()
+    """Redeem an activation link for a user.
 
+    Runs as a single transaction on one connection. The link row is locked
+    while it is checked and consumed, so concurrent redemptions of the same
+    link can't both succeed.
+    """
     try:
-        # Get the link
-        link = get_activation_link(token)
-
-        if not is_activation_link_valid(link):
-            return False, "Link is no longer valid"
+        with pooled_cursor() as cursor:
+            # Get and lock the link
+            cursor.execute(
+                """SELECT al.*, p.slug as profile_slug
+                   FROM activation_link al
+                   JOIN profile p ON al.profile_id = p.id
+                   WHERE al.token = %s
+                   FOR UPDATE""",
+                (token,)
+            )
+            link = cursor.fetchone()
 
-        # Check if user is already a member
-        existing_role = get_user_role(link['profile_id'], user_id)
-        if existing_role:
-            return False, "You already have access to this profile"
+            if not is_activation_link_valid(link):
+                return False, "Link is no longer valid"
 
-        # Add user as member
-        cursor.execute(
-            """INSERT INTO profile_member (profile_id, user_id, role, added_by)
-               VALUES (%s, %s, %s, %s)""",
-            (link['profile_id'], user_id, link['role'], link['created_by'])
-        )
-
-        # Mark link as used
-        cursor.execute(
-            """UPDATE activation_link SET used_by = %s, used_at = NOW()
-               WHERE token = %s""",
-            (user_id, token)
-        )
+            # Add user as member; unique_membership turns a repeat into a no-op
+            cursor.execute(
+                """INSERT IGNORE INTO profile_member (profile_id, user_id, role, added_by)
+                   VALUES (%s, %s, %s, %s)""",
+                (link['profile_id'], user_id, link['role'], link['created_by'])
+            )
+            if cursor.rowcount == 0:
+                return False, "You already have access to this profile"
 
-        db.commit()
-        return True, link['profile_slug']
+            # Mark link as used
+            cursor.execute(
+                """UPDATE activation_link SET used_by = %s, used_at = NOW()
+                   WHERE id = %s""",
+                (user_id, link['id'])
+            )
     except Exception as e:
-        db.rollback()
         return False, str(e)
-    finally:
-        cursor.close()
-        db.close()
+
+    invalidate_user_role(link['profile_id'], user_id)
+    return True, link['profile_slug']
 
 
 def cancel_activation_link(link_id, profile_id):
     """Cancel an activation link."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """UPDATE activation_link SET canceled_at = NOW()
                WHERE id = %s AND profile_id = %s""",
             (link_id, profile_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
 
 
-def get_profile_activation_links(profile_id):
-    """Get all activation links for a profile."""
-    db = get_db()
-    cursor = db.cursor()
+_ACTIVATION_LINKS_SQL = """SELECT al.*,
+                                 creator.display_name as creator_name,
+                                 redeemer.display_name as redeemer_name
+                          FROM activation_link al
+                          JOIN user creator ON al.created_by = creator.id
+                          LEFT JOIN user redeemer ON al.used_by = redeemer.id
+                          WHERE al.profile_id = %s
+                          ORDER BY al.created_at DESC"""
 
-    try:
-        cursor.execute(
-            """SELECT al.*,
-                      creator.display_name as creator_name,
-                      redeemer.display_name as redeemer_name
-               FROM activation_link al
-               JOIN user creator ON al.created_by = creator.id
-               LEFT JOIN user redeemer ON al.used_by = redeemer.id
-               WHERE al.profile_id = %s
-               ORDER BY al.created_at DESC""",
-            (profile_id,)
-        )
+
+def get_profile_activation_links(profile_id, limit=None, offset=0):
+    """Get activation links for a profile, newest first, optionally one page at a time."""
+    sql = _ACTIVATION_LINKS_SQL
+    params = [profile_id]
+    if limit is not None:
+        sql += " LIMIT %s OFFSET %s"
+        params += [limit, offset]
+
+    with pooled_cursor() as cursor:
+        cursor.execute(sql, params)
         return cursor.fetchall()
-    finally:
-        cursor.close()
-        db.close()
+
+
+def iter_profile_activation_links(profile_id):
+    """Stream every activation link for a profile without buffering the result set.
+
+    Uses a server-side cursor, so the pooled connection stays checked out
+    until the generator is exhausted or closed.
+    """
+    with pooled_cursor(pymysql.cursors.SSDictCursor) as cursor:
+        cursor.execute(_ACTIVATION_LINKS_SQL, (profile_id,))
+        yield from cursor
 
 
 # =============================================================================
 # Channel Strip Operations
 # =============================================================================
 
+_CHANNEL_STRIPS_SQL = """SELECT * FROM channel_strip
+                         WHERE profile_id = %s
+                         ORDER BY position"""
+
+
 def get_channel_strips(profile_id):
     """Get all channel strips for a profile."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
-        cursor.execute(
-            """SELECT * FROM channel_strip
-               WHERE profile_id = %s
-               ORDER BY position""",
-            (profile_id,)
-        )
+    with pooled_cursor() as cursor:
+        cursor.execute(_CHANNEL_STRIPS_SQL, (profile_id,))
         return cursor.fetchall()
-    finally:
-        cursor.close()
-        db.close()
 
 
 def get_channel_strip(channel_id):
     """Get a single channel strip."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute("SELECT * FROM channel_strip WHERE id = %s", (channel_id,))
         return cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
+
+
+def get_channel_profile_and_role(channel_id, user_id):
+    """Get (profile_id, role) for a channel and user in one query.
+
+    Returns None if the channel doesn't exist; role is None if the user
+    isn't a member of the channel's profile.
+    """
+    with pooled_cursor() as cursor:
+        cursor.execute(
+            """SELECT cs.profile_id, pm.role
+               FROM channel_strip cs
+               LEFT JOIN profile_member pm
+                 ON pm.profile_id = cs.profile_id AND pm.user_id = %s
+               WHERE cs.id = %s""",
+            (user_id, channel_id)
+        )
+        result = cursor.fetchone()
+
+    if not result:
+        return None
+
+    if user_id is not None:
+        with _cache_lock:
+            _role_cache[(result['profile_id'], user_id)] = result['role']
+    return result['profile_id'], result['role']
 
 
 def create_channel_strip(profile_id, name, position, color='white',
@@ -531,10 +696,7 @@ def create_channel_strip(profile_id, name, position, color='white',
                          midi_cc_mute=None, midi_cc_solo=None,
                          min_level=0, max_level=127):
     """Create a new channel strip."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """INSERT INTO channel_strip
                (profile_id, name, position, color, midi_cc_output, midi_cc_vu_input,
@@ -543,352 +705,465 @@ def create_channel_strip(profile_id, name, position, color='white',
             (profile_id, name, position, color, midi_cc_output, midi_cc_vu_input,
              midi_cc_mute, midi_cc_solo, min_level, max_level)
         )
-        db.commit()
         return cursor.lastrowid
-    finally:
-        cursor.close()
-        db.close()
+
+
+_CHANNEL_STRIP_FIELDS = frozenset({
+    'name', 'position', 'color', 'midi_cc_output', 'midi_cc_vu_input',
+    'midi_cc_mute', 'midi_cc_solo', 'min_level', 'max_level',
+    'current_level', 'is_muted', 'is_solo'
+})
+_channel_update_sql = {}  # sorted field tuple -> UPDATE statement
 
 
 def update_channel_strip(channel_id, **kwargs):
     """Update channel strip properties."""
-    if not kwargs:
+    fields = tuple(sorted(field for field in kwargs if field in _CHANNEL_STRIP_FIELDS))
+    if not fields:
         return
 
-    db = get_db()
-    cursor = db.cursor()
-
-    allowed_fields = ['name', 'position', 'color', 'midi_cc_output', 'midi_cc_vu_input',
-                      'midi_cc_mute', 'midi_cc_solo', 'min_level', 'max_level',
-                      'current_level', 'is_muted', 'is_solo']
-
-    updates = []
-    params = []
-
-    for field, value in kwargs.items():
-        if field in allowed_fields:
-            updates.append(f"{field} = %s")
-            params.append(value)
+    sql = _channel_update_sql.get(fields)
+    if sql is None:
+        sql = _channel_update_sql.setdefault(
+            fields,
+            f"UPDATE channel_strip SET {', '.join(f'{field} = %s' for field in fields)} WHERE id = %s"
+        )
 
-    if updates:
-        params.append(channel_id)
-        try:
-            cursor.execute(
-                f"UPDATE channel_strip SET {', '.join(updates)} WHERE id = %s",
-                params
-            )
-            db.commit()
-        finally:
-            cursor.close()
-            db.close()
+    params = [kwargs[field] for field in fields]
+    params.append(channel_id)
+    with pooled_cursor() as cursor:
+        cursor.execute(sql, params)
 
 
 def delete_channel_strip(channel_id):
     """Delete a channel strip."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute("DELETE FROM channel_strip WHERE id = %s", (channel_id,))
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
 
 
 def reorder_channel_strips(profile_id, channel_order):
     """Reorder channel strips. channel_order is a list of channel IDs in desired order."""
-    db = get_db()
-    cursor = db.cursor()
+    channel_order = [int(channel_id) for channel_id in channel_order]
+    if not channel_order:
+        return
 
-    try:
-        for position, channel_id in enumerate(channel_order):
-            cursor.execute(
-                """UPDATE channel_strip SET position = %s
-                   WHERE id = %s AND profile_id = %s""",
-                (position, channel_id, profile_id)
-            )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+    # One statement for all channels: SET position = CASE id WHEN ... END
+    cases = ' '.join(['WHEN %s THEN %s'] * len(channel_order))
+    ids = ', '.join(['%s'] * len(channel_order))
+    params = [value for position, channel_id in enumerate(channel_order)
+              for value in (channel_id, position)]
+    params.append(profile_id)
+    params.extend(channel_order)
+
+    with pooled_cursor() as cursor:
+        cursor.execute(
+            f"""UPDATE channel_strip SET position = CASE id {cases} END
+                WHERE profile_id = %s AND id IN ({ids})""",
+            params
+        )
 
 
+# The state setters below bump state_version through LAST_INSERT_ID(expr),
+# which hands the new value back in the UPDATE's OK packet as lastrowid,
+# so callers get it without a follow-up SELECT.
+
 def update_fader_level(channel_id, level):
-    """Update just the fader level (optimized for frequent updates)."""
-    db = get_db()
-    cursor = db.cursor()
+    """Update just the fader level (optimized for frequent updates).
 
-    try:
+    Returns the channel's new state_version.
+    """
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "UPDATE channel_strip SET current_level = %s, state_version = state_version + 1 WHERE id = %s",
+            """UPDATE channel_strip
+               SET current_level = %s, state_version = LAST_INSERT_ID(state_version + 1)
+               WHERE id = %s""",
             (level, channel_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+        return cursor.lastrowid
 
 
 def update_mute_state(channel_id, is_muted):
-    """Update mute state."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    """Update mute state. Returns the channel's new state_version."""
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "UPDATE channel_strip SET is_muted = %s, state_version = state_version + 1 WHERE id = %s",
+            """UPDATE channel_strip
+               SET is_muted = %s, state_version = LAST_INSERT_ID(state_version + 1)
+               WHERE id = %s""",
             (is_muted, channel_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+        return cursor.lastrowid
 
 
 def update_solo_state(channel_id, is_solo):
-    """Update solo state."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    """Update solo state. Returns the channel's new state_version."""
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "UPDATE channel_strip SET is_solo = %s, state_version = state_version + 1 WHERE id = %s",
+            """UPDATE channel_strip
+               SET is_solo = %s, state_version = LAST_INSERT_ID(state_version + 1)
+               WHERE id = %s""",
             (is_solo, channel_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+        return cursor.lastrowid
 
 
-def update_vu_level(channel_id, level):
-    """Update VU meter level (no version increment - ephemeral data)."""
-    db = get_db()
-    cursor = db.cursor()
+def bulk_update_channel_state(rows):
+    """Persist buffered channel state in one batch.
 
-    try:
+    rows is a list of (level, is_muted, is_solo, channel_id) tuples; None
+    leaves that column unchanged.
+    """
+    if not rows:
+        return
+
+    # One statement for all channels, one CASE per column. executemany
+    # would still send (and the server parse) one UPDATE per row.
+    case = "CASE id " + ' '.join(["WHEN %s THEN COALESCE(%s, {0})"] * len(rows)) + " END"
+    ids = ', '.join(['%s'] * len(rows))
+    params = []
+    for column in range(3):
+        for row in rows:
+            params += (row[3], row[column])
+    params.extend(row[3] for row in rows)
+
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "UPDATE channel_strip SET vu_level = %s WHERE id = %s",
-            (level, channel_id)
+            f"""UPDATE channel_strip
+                SET current_level = {case.format('current_level')},
+                    is_muted = {case.format('is_muted')},
+                    is_solo = {case.format('is_solo')},
+                    state_version = state_version + 1
+                WHERE id IN ({ids})""",
+            params
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+
+# =============================================================================
+# VU Levels (ephemeral)
+# =============================================================================
+
+# VU meters change many times a second and are worthless a moment later, so
+# they are kept out of MySQL: in Redis when configured (shared by all
+# workers), otherwise in this process.
+VU_TTL = 10  # seconds a profile's VU levels outlive their last update
+
+_vu_levels = {}  # profile_id -> {channel_id: level}, when Redis isn't configured
+_vu_lock = threading.Lock()
+
+
+def update_vu_level(profile_id, channel_id, level):
+    """Update one channel's VU meter level."""
+    update_vu_levels_bulk(profile_id, {channel_id: level})
 
 
 def update_vu_levels_bulk(profile_id, vu_data):
     """Update multiple VU levels at once. vu_data is {channel_id: level}."""
-    db = get_db()
-    cursor = db.cursor()
+    if not vu_data:
+        return
+
+    if _redis is not None:
+        key = f'vu:{profile_id}'
+        pipe = _redis.pipeline(transaction=False)
+        pipe.hset(key, mapping=vu_data)
+        pipe.expire(key, VU_TTL)
+        pipe.execute()
+    else:
+        with _vu_lock:
+            _vu_levels.setdefault(profile_id, {}).update(vu_data)
 
-    try:
-        for channel_id, level in vu_data.items():
-            cursor.execute(
-                "UPDATE channel_strip SET vu_level = %s WHERE id = %s AND profile_id = %s",
-                (level, channel_id, profile_id)
-            )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+def get_vu_levels(profile_id):
+    """Get the latest VU levels for a profile as {channel_id: level}."""
+    if _redis is not None:
+        return {int(k): int(v) for k, v in _redis.hgetall(f'vu:{profile_id}').items()}
+
+    with _vu_lock:
+        return dict(_vu_levels.get(profile_id, ()))
 
 
 # =============================================================================
 # Responsibility System
 # =============================================================================
 
+_RESPONSIBILITY_SQL = """SELECT pr.*, u.username, u.display_name
+                         FROM profile_responsibility pr
+                         LEFT JOIN user u ON pr.user_id = u.id
+                         WHERE pr.profile_id = %s"""
+
+
 def get_responsibility(profile_id):
     """Get who has responsibility for a profile."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
-        cursor.execute(
-            """SELECT pr.*, u.username, u.display_name
-               FROM profile_responsibility pr
-               LEFT JOIN user u ON pr.user_id = u.id
-               WHERE pr.profile_id = %s""",
-            (profile_id,)
-        )
+    with pooled_cursor() as cursor:
+        cursor.execute(_RESPONSIBILITY_SQL, (profile_id,))
         return cursor.fetchone()
-    finally:
-        cursor.close()
-        db.close()
+
+
+def load_profile_bundle(profile_id):
+    """Load channel strips, responsibility and members for a profile page.
+
+    The three SELECTs run back to back on a single pooled connection.
+    """
+    with pooled_cursor() as cursor:
+        cursor.execute(_CHANNEL_STRIPS_SQL, (profile_id,))
+        channels = cursor.fetchall()
+        cursor.execute(_RESPONSIBILITY_SQL, (profile_id,))
+        responsibility = cursor.fetchone()
+        cursor.execute(_MEMBERS_SQL, (profile_id,))
+        members = cursor.fetchall()
+
+    return {
+        'channels': channels,
+        'responsibility': responsibility,
+        'members': members
+    }
 
 
 def take_responsibility(profile_id, user_id):
     """Take responsibility for a profile."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """UPDATE profile_responsibility
                SET user_id = %s, taken_at = NOW()
                WHERE profile_id = %s""",
             (user_id, profile_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
 
 
 def drop_responsibility(profile_id, user_id):
     """Drop responsibility (only if you have it)."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """UPDATE profile_responsibility
                SET user_id = NULL, taken_at = NULL
                WHERE profile_id = %s AND user_id = %s""",
             (profile_id, user_id)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+
+def drop_responsibility_bulk(pairs):
+    """Drop responsibility for several (profile_id, user_id) pairs at once.
+
+    Returns the profile_ids where the user held responsibility and it was
+    cleared.
+    """
+    if not pairs:
+        return []
+
+    placeholders = ', '.join(['(%s, %s)'] * len(pairs))
+    params = [value for pair in pairs for value in pair]
+
+    with pooled_cursor() as cursor:
+        cursor.execute(
+            f"""SELECT profile_id FROM profile_responsibility
+                WHERE (profile_id, user_id) IN ({placeholders})
+                FOR UPDATE""",
+            params
+        )
+        dropped = [row['profile_id'] for row in cursor.fetchall()]
+
+        if dropped:
+            cursor.execute(
+                f"""UPDATE profile_responsibility
+                    SET user_id = NULL, taken_at = NULL
+                    WHERE (profile_id, user_id) IN ({placeholders})""",
+                params
+            )
+
+    return dropped
 
 
 # =============================================================================
 # Session Helpers (for ephemeral data)
 # =============================================================================
 
-class DateTimeEncoder(json.JSONEncoder):
-    """Custom JSON encoder for datetime objects."""
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return {'__datetime__': obj.isoformat()}
-        return super().default(obj)
+# Session data is stored as msgpack. datetimes are packed as an extension
+# type holding their ISO string so they come back as datetime objects.
+_DATETIME_EXT = 1
+
 
+def _pack_default(obj):
+    if isinstance(obj, datetime):
+        return ormsgpack.Ext(_DATETIME_EXT, obj.isoformat().encode())
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
 
-def datetime_decoder(dct):
-    """Custom JSON decoder for datetime objects."""
-    if '__datetime__' in dct:
-        return datetime.fromisoformat(dct['__datetime__'])
-    return dct
+
+def _unpack_ext(code, data):
+    if code == _DATETIME_EXT:
+        return datetime.fromisoformat(data.decode())
+    raise ValueError(f"Unknown session extension type {code}")
 
 
 def save_session_data(session_id, data):
     """Save session data to database."""
-    db = get_db()
-    cursor = db.cursor()
-
-    data_json = json.dumps(data, cls=DateTimeEncoder)
+    data_blob = ormsgpack.packb(
+        data, default=_pack_default, option=ormsgpack.OPT_PASSTHROUGH_DATETIME
+    )
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """INSERT INTO session (session_id, created_at, last_accessed_at, data)
                VALUES (%s, NOW(), NOW(), %s)
                ON DUPLICATE KEY UPDATE last_accessed_at = NOW(), data = VALUES(data)""",
-            (session_id, data_json)
+            (session_id, data_blob)
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+
+
+SESSION_TOUCH_INTERVAL = 60  # seconds between last_accessed_at refreshes
 
 
 def get_session_data(session_id):
-    """Load session data from database."""
-    db = get_db()
-    cursor = db.cursor()
+    """Load session data from database.
 
-    try:
+    last_accessed_at only drives expiry, so it is refreshed at most once a
+    minute rather than on every load. Rows that don't decode as msgpack
+    (such as JSON written before the switch) load as an empty session.
+    """
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "SELECT data FROM session WHERE session_id = %s",
-            (session_id,)
+            """SELECT data,
+                      last_accessed_at < DATE_SUB(NOW(), INTERVAL %s SECOND) AS stale
+               FROM session WHERE session_id = %s""",
+            (SESSION_TOUCH_INTERVAL, session_id)
         )
         result = cursor.fetchone()
 
         if result:
-            cursor.execute(
-                "UPDATE session SET last_accessed_at = NOW() WHERE session_id = %s",
-                (session_id,)
-            )
-            db.commit()
-
-            data_str = result['data'] if isinstance(result, dict) else result[0]
-            return json.loads(data_str, object_hook=datetime_decoder)
+            if result['stale']:
+                cursor.execute(
+                    "UPDATE session SET last_accessed_at = NOW() WHERE session_id = %s",
+                    (session_id,)
+                )
+
+            try:
+                data = ormsgpack.unpackb(result['data'], ext_hook=_unpack_ext)
+            except (ormsgpack.MsgpackDecodeError, TypeError):
+                return {}
+            return data if isinstance(data, dict) else {}
 
         return None
-    finally:
-        cursor.close()
-        db.close()
+
+
+CLEANUP_CHUNK = 1000  # rows deleted per statement by the cleanup helpers
+
+
+def _delete_in_chunks(sql, params=()):
+    """Run a DELETE ... LIMIT repeatedly, committing after each chunk.
+
+    Keeps each statement's lock footprint and undo log small so requests
+    touching the same table aren't stalled behind one large delete.
+    """
+    while True:
+        with pooled_cursor() as cursor:
+            cursor.execute(f"{sql} LIMIT {CLEANUP_CHUNK}", params)
+            deleted = cursor.rowcount
+        if deleted < CLEANUP_CHUNK:
+            break
 
 
 def cleanup_old_sessions():
     """Remove sessions older than 24 hours."""
-    db = get_db()
-    cursor = db.cursor()
-
-    try:
-        cursor.execute(
-            "DELETE FROM session WHERE last_accessed_at < DATE_SUB(NOW(), INTERVAL 24 HOUR)"
-        )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+    _delete_in_chunks(
+        "DELETE FROM session WHERE last_accessed_at < %s",
+        (datetime.now() - timedelta(hours=24),)
+    )
 
 
 # =============================================================================
 # Profile Activity Tracking (for online users list)
 # =============================================================================
 
+# With Redis, presence is a sorted set per profile (user_id scored by last
+# seen epoch) and never touches MySQL. Otherwise heartbeats are buffered and
+# written to profile_activity in batches by flush_profile_activity, so a
+# burst of polls costs one commit instead of one per poll.
+PRESENCE_TTL = 300  # seconds before a heartbeat is forgotten
+
+_pending_activity = {}  # (profile_id, user_id) -> last seen, awaiting flush
+_activity_lock = threading.Lock()
+
+
 def update_profile_activity(profile_id, user_id):
     """Update user's last seen time for a profile."""
-    db = get_db()
-    cursor = db.cursor()
+    if _redis is not None:
+        key = f'presence:{profile_id}'
+        pipe = _redis.pipeline(transaction=False)
+        pipe.zadd(key, {user_id: time.time()})
+        pipe.expire(key, PRESENCE_TTL)
+        pipe.execute()
+        return
 
-    try:
-        cursor.execute(
+    with _activity_lock:
+        _pending_activity[(profile_id, user_id)] = datetime.now()
+
+
+def flush_profile_activity():
+    """Write buffered heartbeats in a single statement and transaction."""
+    with _activity_lock:
+        batch = list(_pending_activity.items())
+        _pending_activity.clear()
+
+    if not batch:
+        return
+
+    with pooled_cursor() as cursor:
+        cursor.executemany(
             """INSERT INTO profile_activity (profile_id, user_id, last_seen_at)
-               VALUES (%s, %s, NOW())
-               ON DUPLICATE KEY UPDATE last_seen_at = NOW()""",
-            (profile_id, user_id)
+               VALUES (%s, %s, %s)
+               ON DUPLICATE KEY UPDATE last_seen_at = VALUES(last_seen_at)""",
+            [(profile_id, user_id, seen) for (profile_id, user_id), seen in batch]
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
 
 
 def get_active_users(profile_id, timeout_seconds=30):
     """Get users who have been active in the last N seconds."""
-    db = get_db()
-    cursor = db.cursor()
+    if _redis is not None:
+        return _get_active_users_redis(profile_id, timeout_seconds)
 
-    try:
+    with pooled_cursor() as cursor:
         cursor.execute(
             """SELECT pa.user_id, u.username, u.display_name
                FROM profile_activity pa
                JOIN user u ON pa.user_id = u.id
                WHERE pa.profile_id = %s
-                 AND pa.last_seen_at > DATE_SUB(NOW(), INTERVAL %s SECOND)
+                 AND pa.last_seen_at > %s
                ORDER BY pa.last_seen_at DESC""",
-            (profile_id, timeout_seconds)
+            (profile_id, datetime.now() - timedelta(seconds=timeout_seconds))
         )
         return cursor.fetchall()
-    finally:
-        cursor.close()
-        db.close()
 
 
-def cleanup_old_activity():
-    """Remove activity records older than 5 minutes."""
-    db = get_db()
-    cursor = db.cursor()
+def _get_active_users_redis(profile_id, timeout_seconds):
+    key = f'presence:{profile_id}'
+    now = time.time()
+    pipe = _redis.pipeline(transaction=False)
+    pipe.zremrangebyscore(key, '-inf', now - PRESENCE_TTL)
+    pipe.zrevrangebyscore(key, '+inf', now - timeout_seconds)
+    user_ids = [int(user_id) for user_id in pipe.execute()[1]]
+    if not user_ids:
+        return []
 
-    try:
+    # Resolve names in one query, keeping most-recently-seen order
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with pooled_cursor() as cursor:
         cursor.execute(
-            "DELETE FROM profile_activity WHERE last_seen_at < DATE_SUB(NOW(), INTERVAL 5 MINUTE)"
+            f"SELECT id, username, display_name FROM user WHERE id IN ({placeholders})",
+            user_ids
         )
-        db.commit()
-    finally:
-        cursor.close()
-        db.close()
+        names = {row['id']: row for row in cursor.fetchall()}
+
+    return [{
+        'user_id': user_id,
+        'username': names[user_id]['username'],
+        'display_name': names[user_id]['display_name']
+    } for user_id in user_ids if user_id in names]
+
+
+def cleanup_old_activity():
+    """Remove activity records older than 5 minutes."""
+    if _redis is not None:
+        # Redis presence expires by itself
+        return
+
+    _delete_in_chunks(
+        "DELETE FROM profile_activity WHERE last_seen_at < %s",
+        (datetime.now() - timedelta(minutes=5),)
+    )
@@ -50,7 +50,8 @@ CREATE TABLE activation_link (
     used_at DATETIME,                      -- NULL if unused
     FOREIGN KEY (profile_id) REFERENCES profile(id) ON DELETE CASCADE,
     FOREIGN KEY (created_by) REFERENCES user(id),
-    FOREIGN KEY (used_by) REFERENCES user(id)
+    FOREIGN KEY (used_by) REFERENCES user(id),
+    INDEX idx_profile_created (profile_id, created_at)
 );
 
 -- Channel strips within a profile
@@ -70,7 +71,7 @@ CREATE TABLE channel_strip (
     is_muted BOOLEAN DEFAULT FALSE,        -- Mute button state
     is_solo BOOLEAN DEFAULT FALSE,         -- Solo button state
     state_version INT DEFAULT 0,           -- Increments on every state change (level/mute/solo)
-    vu_level INT DEFAULT 0,                -- Current VU meter level (0-127, ephemeral)
+    vu_level INT DEFAULT 0,                -- Unused: live VU levels are kept in Redis or in memory
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (profile_id) REFERENCES profile(id) ON DELETE CASCADE,
@@ -93,13 +94,20 @@ CREATE TABLE profile_activity (
     last_seen_at DATETIME NOT NULL,
     PRIMARY KEY (profile_id, user_id),
     FOREIGN KEY (profile_id) REFERENCES profile(id) ON DELETE CASCADE,
-    FOREIGN KEY (user_id) REFERENCES user(id)
+    FOREIGN KEY (user_id) REFERENCES user(id),
+    INDEX idx_profile_seen (profile_id, last_seen_at),
+    INDEX idx_last_seen (last_seen_at)
 );
 
 -- Session table for ephemeral data
+-- Upgrading from the JSON column: session data is throwaway, so clear it
+-- and change the type (old rows would otherwise load as empty sessions):
+--   TRUNCATE TABLE session;
+--   ALTER TABLE session MODIFY data BLOB;
 CREATE TABLE session (
     session_id VARCHAR(255) PRIMARY KEY,
     created_at DATETIME NOT NULL,
     last_accessed_at DATETIME NOT NULL,
-    data JSON
+    data BLOB,                             -- msgpack-encoded
+    INDEX idx_last_accessed (last_accessed_at)
 );
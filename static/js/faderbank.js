@@ -147,7 +147,7 @@
                     channelVersions[channel.id] = serverVersion;
 
                     // Only update fader if we're not currently dragging it
-                    if (activeFader !== channel) {
+                    if (!(activeFader && activeFader.channel === channel)) {
                         if (channel.current_level !== update.current_level) {
                             channel.current_level = update.current_level;
                             needsRender = true;
@@ -252,16 +252,13 @@
             console.log('Disconnected from server');
         });
 
-        socket.on('channel_state', (data) => {
-            channels = data.channels;
+        socket.on('join_snapshot', (data) => {
+            onlineUsers = data.online_users;
+            applyChannelColumns(data.channels);
+            applyResponsibilityChange(data.responsibility);
             render();
         });
 
-        socket.on('online_users', (data) => {
-            onlineUsers = data.users;
-            updateOnlineUsersList();
-        });
-
         socket.on('user_joined', (data) => {
             onlineUsers[data.user_id] = { display_name: data.display_name };
             updateOnlineUsersList();
@@ -272,13 +269,19 @@
             updateOnlineUsersList();
         });
 
-        socket.on('fader_update', (data) => {
-            const channel = channels.find(c => c.id === data.channel_id);
-            if (channel) {
-                channel.current_level = data.level;
-                render();
-                sendMidiFader(channel);
+        socket.on('fader_update_batch', (data) => {
+            applyFaderUpdates(data.updates.map(u => [u.channel_id, u.level]));
+        });
+
+        socket.on('fader_update_batch_bin', (buffer) => {
+            // <I count, then count x (<I channel_id, B level)
+            const view = new DataView(buffer);
+            const count = view.getUint32(0, true);
+            const updates = [];
+            for (let i = 0, offset = 4; i < count; i++, offset += 5) {
+                updates.push([view.getUint32(offset, true), view.getUint8(offset + 4)]);
             }
+            applyFaderUpdates(updates);
         });
 
         socket.on('mute_update', (data) => {
@@ -301,11 +304,13 @@
             }
         });
 
-        socket.on('vu_update', (data) => {
-            const channel = channels.find(c => c.id === data.channel_id);
-            if (channel) {
-                channel.vu_level = data.level;
-                // Don't call render() here - animation loop handles it
+        socket.on('vu_update_batch', (data) => {
+            for (const update of data.updates) {
+                const channel = channels.find(c => c.id === update.channel_id);
+                if (channel && !localVuChannels.has(channel.id)) {
+                    channel.vu_level = update.level;
+                    // Don't call render() here - animation loop handles it
+                }
             }
         });
 
@@ -339,14 +344,7 @@
             render();
         });
 
-        socket.on('responsibility_changed', (data) => {
-            responsibilityUser = data.user_id ? {
-                user_id: data.user_id,
-                display_name: data.display_name
-            } : null;
-            updateResponsibilityUI();
-            updateOnlineUsersList();
-        });
+        socket.on('responsibility_changed', applyResponsibilityChange);
 
         socket.on('confirm_take_responsibility', (data) => {
             showResponsibilityConfirmModal(data.current_display_name);
@@ -366,6 +364,54 @@
         });
     }
 
+    function applyFaderUpdates(updates) {
+        let needsRender = false;
+        for (const [channelId, level] of updates) {
+            const channel = channels.find(c => c.id === channelId);
+            // Batches from several senders reach everyone, so skip the fader we're dragging
+            if (channel && !(activeFader && activeFader.channel === channel)) {
+                channel.current_level = level;
+                needsRender = true;
+                sendMidiFader(channel);
+            }
+        }
+        if (needsRender) {
+            render();
+        }
+    }
+
+    function applyChannelColumns(state) {
+        // Server sends parallel arrays plus hex bitmasks for mute/solo
+        const muteMask = BigInt('0x' + state.mutes);
+        const soloMask = BigInt('0x' + state.solos);
+        const known = new Map(channels.map(c => [c.id, c]));
+
+        channels = state.ids.map((id, i) => {
+            const channel = known.get(id) || {
+                id: id, color: 'white', min_level: 0, max_level: 127, vu_level: 0
+            };
+            const bit = BigInt(i);
+
+            channel.name = state.names[i];
+            if (!(activeFader && activeFader.channel === channel)) {
+                channel.current_level = state.levels[i];
+            }
+            channel.is_muted = ((muteMask >> bit) & 1n) === 1n;
+            channel.is_solo = ((soloMask >> bit) & 1n) === 1n;
+            channelVersions[id] = state.versions[i];
+            return channel;
+        });
+    }
+
+    function applyResponsibilityChange(data) {
+        responsibilityUser = data && data.user_id ? {
+            user_id: data.user_id,
+            display_name: data.display_name
+        } : null;
+        updateResponsibilityUI();
+        updateOnlineUsersList();
+    }
+
     // ==========================================================================
     // Canvas Rendering
     // ==========================================================================
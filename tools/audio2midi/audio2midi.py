@@ -18,8 +18,14 @@ import signal
 import sys
 import time
 import threading
+from math import exp as _exp, sqrt as _sqrt
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # Optional: without Numba the NumPy code path is used
+
 try:
     import sounddevice as sd
 except ImportError:
@@ -33,38 +39,165 @@ except ImportError:
     sys.exit(1)
 
 
+# RMS -> 0..1 level lookup table. Entries are spaced linearly in RMS, so
+# resolution is coarsest at the quiet end: around 1 CC step near -60 dB and
+# far finer above that.
+LEVEL_LUT_SIZE = 16384
+
+# Capacity of the queue carrying CC messages from the audio callback to the
+# MIDI sender thread
+MIDI_QUEUE_SIZE = 1024
+
+# Longest the MIDI sender sleeps before rechecking whether it was stopped
+STOP_CHECK_INTERVAL = 0.25
+
+
+def build_level_lut(size=LEVEL_LUT_SIZE):
+    """Map RMS 0..1 (in `size` even steps) to a level, -60dB..0dB -> 0..1."""
+    rms = np.linspace(0.0, 1.0, size)
+    with np.errstate(divide='ignore'):
+        db = 20 * np.log10(rms)
+    return np.clip((db + 60) / 60, 0, 1).astype(np.float32)
+
+
+def _process_block(indata, ch_idx, rms_ring, rms_sums, ring_pos, level_lut,
+                   smoothed, peaks, peak_times, last_cc, attack_coef, release_coef,
+                   now, peak_hold_ns, release_ns, deadband, changed):
+    """Run one audio block through the meter for every mapped channel.
+
+    Same steps as AudioToMidi's NumPy path, written as scalar loops for
+    Numba to compile. State arrays are updated in place; ring_pos holds
+    [write index, fill count]. Indices of channels whose CC value moved by
+    more than `deadband` (or reached 0/127) are written to `changed`, and
+    their count is returned.
+    """
+    frames = indata.shape[0]
+    window = rms_ring.shape[0]
+    index = ring_pos[0]
+    count = min(ring_pos[1] + 1, window)
+    lut_scale = level_lut.shape[0] - 1
+    n_changed = 0
+
+    for i in range(ch_idx.shape[0]):
+        ch = ch_idx[i]
+        ssq = 0.0
+        for j in range(frames):
+            x = indata[j, ch]
+            ssq += x * x
+        rms = _sqrt(ssq / frames)
+
+        rms_sums[i] += rms - rms_ring[index, i]
+        rms_ring[index, i] = rms
+        bucket = int(rms_sums[i] * lut_scale / count + 0.5)
+        level = level_lut[min(max(bucket, 0), lut_scale)]
+
+        current = smoothed[i]
+        coef = attack_coef if level > current else 1.0 - release_coef
+        level = current + (level - current) * coef
+        smoothed[i] = level
+
+        peak = peaks[i]
+        if level >= peak:
+            peak = level
+            peak_times[i] = now
+        else:
+            held_over = now - peak_times[i] - peak_hold_ns
+            if held_over > 0:
+                peak = level + (peak - level) * _exp(-held_over / release_ns)
+        peaks[i] = peak
+
+        cc = min(max(int(peak * 127), 0), 127)
+        last = last_cc[i]
+        if cc != last and (abs(cc - last) > deadband or cc == 0 or cc == 127 or last < 0):
+            last_cc[i] = cc
+            changed[n_changed] = i
+            n_changed += 1
+
+    ring_pos[0] = (index + 1) % window
+    ring_pos[1] = count
+    return n_changed
+
+
+process_block = njit(cache=True, fastmath=True)(_process_block) if njit else None
+
+
 class AudioToMidi:
     def __init__(self, audio_device, midi_port, channel_mappings, midi_channel=1,
                  sample_rate=44100, block_size=1024, peak_hold_ms=100,
-                 attack_ms=10, release_ms=300, avg_window=8):
+                 attack_ms=10, release_ms=300, avg_window=8, deadband=0):
         self.audio_device = audio_device
         self.midi_port = midi_port
         self.channel_mappings = channel_mappings  # {audio_ch: cc_number}
+        self._ch_idx = np.fromiter(channel_mappings.keys(), dtype=np.intp)
+        self._cc_nums = np.fromiter(channel_mappings.values(), dtype=np.intp)
+
+        # Mapped channels that form an ascending run (e.g. 0,1,2) can be read
+        # through a slice, which is a view; any other set needs a gathering copy
+        first = int(self._ch_idx[0])
+        if np.array_equal(self._ch_idx, np.arange(first, first + len(self._ch_idx))):
+            self._ch_select = slice(first, first + len(self._ch_idx))
+        else:
+            self._ch_select = self._ch_idx
+
         self.midi_channel = midi_channel - 1  # Convert to 0-indexed
+        self._status = 0xB0 | self.midi_channel  # Control Change on our channel
         self.sample_rate = sample_rate
         self.block_size = block_size
         self.peak_hold_ms = peak_hold_ms
         self.attack_ms = attack_ms
         self.release_ms = release_ms
-        self.avg_window = avg_window  # Number of RMS readings to average
+        self.avg_window = max(1, avg_window)  # Number of RMS readings to average
+        # CC changes of this many steps or fewer are dropped, so meter noise
+        # around a steady level doesn't flood the bus; 0 sends every change
+        self.deadband = max(0, deadband)
+
+        self._level_lut = build_level_lut()
+        self._lut_scale = LEVEL_LUT_SIZE - 1
+
+        # Attack/release coefficients for one block period; blocks arrive at a
+        # fixed rate, so these only need recomputing after a dropout
+        self._block_ms = 1000.0 * block_size / sample_rate
+        self._attack_coef = 1 - _exp(-self._block_ms / attack_ms)
+        self._release_coef = _exp(-self._block_ms / release_ms)
+        self._last_callback_ns = None
+
+        # Timing in integer nanoseconds from time.monotonic_ns()
+        self._peak_hold_ns = peak_hold_ms * 1_000_000
+        self._release_ns = release_ms * 1_000_000
 
         self.running = False
         self.midi_out = None
         self.stream = None
 
-        # State per channel
-        self.smoothed_levels = {}
-        self.peak_levels = {}
-        self.peak_times = {}
-        self.last_cc_values = {}
-        self.rms_buffers = {}  # Running average buffers
-
-        for ch in channel_mappings.keys():
-            self.smoothed_levels[ch] = 0.0
-            self.peak_levels[ch] = 0.0
-            self.peak_times[ch] = 0
-            self.last_cc_values[ch] = -1
-            self.rms_buffers[ch] = []  # Circular buffer for RMS averaging
+        # State per channel, as parallel arrays in channel_mappings order
+        k = len(channel_mappings)
+        self.smoothed = np.zeros(k, np.float32)
+        self.peaks = np.zeros(k, np.float32)
+        self.peak_times = np.zeros(k, np.int64)  # monotonic ns
+        self.last_cc = np.full(k, -1, np.int16)
+
+        # Ring of the last avg_window RMS readings (one row per block); every
+        # channel advances together, so the write index and fill count are shared
+        self.rms_ring = np.zeros((self.avg_window, k), np.float32)
+        self.rms_sums = np.zeros(k, np.float64)
+        self.ring_pos = np.zeros(2, np.int64)  # [write index, fill count]
+        self._changed = np.empty(k, np.intp)
+
+        # Scratch buffers so the NumPy path doesn't allocate per block
+        self._gathered = np.empty((block_size, k), np.float32)
+        self._rms = np.empty(k, np.float32)
+        self._cc = np.empty(k, np.int16)
+
+        # With a one-block window the average is just the latest reading
+        self._average_rms = self._ring_average if self.avg_window > 1 else self._latest_rms
+
+        # Single-producer/single-consumer ring of (cc_number, value) pairs.
+        # The audio callback only advances the head, the sender thread only
+        # the tail, so no lock is needed.
+        self._mq = np.zeros((MIDI_QUEUE_SIZE, 2), np.int16)
+        self._mq_head = 0
+        self._mq_tail = 0
+        self._mq_ready = threading.Event()  # Set when the head advances
 
     def start(self):
         # Initialize MIDI output
@@ -106,20 +239,26 @@ class AudioToMidi:
         device_info = devices[device_index]
         print(f"Opened audio device: {device_info['name']}")
 
-        # Determine channels needed
-        max_channel = max(self.channel_mappings.keys()) + 1
+        # Determine channels needed. The stream opens exactly this many, so
+        # every mapped index is in range and the callback never checks.
+        max_channel = int(self._ch_idx.max()) + 1
         if max_channel > device_info['max_input_channels']:
             print(f"Error: Device only has {device_info['max_input_channels']} input channels")
             sys.exit(1)
 
         self.running = True
 
+        # Compile the Numba kernel now rather than on the first audio block
+        if process_block is not None:
+            self._warm_up_kernel(max_channel)
+
         # Start audio stream
         self.stream = sd.InputStream(
             device=device_index,
             channels=max_channel,
             samplerate=self.sample_rate,
             blocksize=self.block_size,
+            dtype='float32',
             callback=self.audio_callback
         )
         self.stream.start()
@@ -128,93 +267,171 @@ class AudioToMidi:
         print(f"MIDI Channel: {self.midi_channel + 1}")
         print("Running... Press Ctrl+C to stop")
 
+    def _warm_up_kernel(self, channels):
+        """Run process_block once on scratch state with the real dtypes.
+
+        Numba compiles on first call; doing that inside the PortAudio
+        callback would stall the first block and cause dropouts.
+        """
+        indata = np.zeros((self.block_size, channels), np.float32)
+        process_block(indata, self._ch_idx, np.zeros_like(self.rms_ring),
+                      np.zeros_like(self.rms_sums), np.zeros_like(self.ring_pos),
+                      self._level_lut, np.zeros_like(self.smoothed),
+                      np.zeros_like(self.peaks), np.zeros_like(self.peak_times),
+                      np.full_like(self.last_cc, -1), self._attack_coef,
+                      self._release_coef, time.monotonic_ns(), self._peak_hold_ns,
+                      self._release_ns, self.deadband, np.empty_like(self._changed))
+
     def audio_callback(self, indata, frames, time_info, status):
         if status:
             print(f"Audio status: {status}")
 
-        now = time.time() * 1000  # ms
+        now = time.monotonic_ns()
+
+        attack_coef, release_coef = self._attack_coef, self._release_coef
+        if status and self._last_callback_ns is not None:
+            delta_ms = (now - self._last_callback_ns) / 1_000_000
+            if abs(delta_ms - self._block_ms) > self._block_ms / 2:
+                attack_coef = 1 - _exp(-delta_ms / self.attack_ms)
+                release_coef = _exp(-delta_ms / self.release_ms)
+        self._last_callback_ns = now
+
+        if process_block is not None:
+            n = process_block(indata, self._ch_idx, self.rms_ring, self.rms_sums,
+                              self.ring_pos, self._level_lut, self.smoothed, self.peaks,
+                              self.peak_times, self.last_cc, attack_coef, release_coef,
+                              now, self._peak_hold_ns, self._release_ns, self.deadband,
+                              self._changed)
+            changed = self._changed[:n]
+        else:
+            changed = self._process_numpy(indata, frames, now, attack_coef, release_coef)
 
-        for audio_ch, cc_num in self.channel_mappings.items():
-            if audio_ch >= indata.shape[1]:
+        # Hand changed values to the MIDI sender thread
+        head = self._mq_head
+        for i in changed:
+            if head - self._mq_tail >= MIDI_QUEUE_SIZE:
+                self.last_cc[i] = -1  # Queue full; resend on the next block
                 continue
-
-            # Calculate RMS level for this channel
-            channel_data = indata[:, audio_ch]
-            rms = np.sqrt(np.mean(channel_data ** 2))
-
-            # Add to running average buffer
-            self.rms_buffers[audio_ch].append(rms)
-            if len(self.rms_buffers[audio_ch]) > self.avg_window:
-                self.rms_buffers[audio_ch].pop(0)
-
-            # Use averaged RMS for smoother output
-            avg_rms = np.mean(self.rms_buffers[audio_ch])
-
-            # Convert to dB and then to 0-1 range
-            # Assuming -60dB to 0dB range
-            if avg_rms > 0:
-                db = 20 * np.log10(avg_rms)
-            else:
-                db = -60
-
-            # Normalize to 0-1 (map -60dB..0dB to 0..1)
-            level = max(0, min(1, (db + 60) / 60))
-
-            # Time-based smoothing (proper VU ballistics)
-            # Calculate time since last update for this channel
-            last_time = getattr(self, '_last_update_times', {}).get(audio_ch, now)
-            if not hasattr(self, '_last_update_times'):
-                self._last_update_times = {}
-            delta_ms = now - last_time
-            self._last_update_times[audio_ch] = now
-
-            # Use configured attack and release times
-            attack_ms = self.attack_ms
-            release_ms = self.release_ms
-
-            current = self.smoothed_levels[audio_ch]
-
-            if level > current:
-                # Attack - fast rise
-                attack_coef = 1 - np.exp(-delta_ms / attack_ms)
-                self.smoothed_levels[audio_ch] = current + (level - current) * attack_coef
-            else:
-                # Release - slow fall
-                release_coef = np.exp(-delta_ms / release_ms)
-                self.smoothed_levels[audio_ch] = level + (current - level) * release_coef
-
-            # Peak hold
-            if self.smoothed_levels[audio_ch] >= self.peak_levels[audio_ch]:
-                self.peak_levels[audio_ch] = self.smoothed_levels[audio_ch]
-                self.peak_times[audio_ch] = now
-            elif now - self.peak_times[audio_ch] > self.peak_hold_ms:
-                # Gradually fall from peak instead of snapping
-                fall_coef = np.exp(-(now - self.peak_times[audio_ch] - self.peak_hold_ms) / release_ms)
-                self.peak_levels[audio_ch] = self.smoothed_levels[audio_ch] + \
-                    (self.peak_levels[audio_ch] - self.smoothed_levels[audio_ch]) * fall_coef
-
-            # Convert to MIDI CC value
-            cc_value = int(self.peak_levels[audio_ch] * 127)
-            cc_value = max(0, min(127, cc_value))
-
-            # Only send if changed
-            if cc_value != self.last_cc_values[audio_ch]:
-                self.send_cc(cc_num, cc_value)
-                self.last_cc_values[audio_ch] = cc_value
-
-    def send_cc(self, cc_number, value):
-        # MIDI CC message: [0xB0 + channel, cc_number, value]
-        message = [0xB0 + self.midi_channel, cc_number, value]
-        self.midi_out.send_message(message)
+            self._mq[head % MIDI_QUEUE_SIZE] = (self._cc_nums[i], self.last_cc[i])
+            head += 1
+        if head != self._mq_head:
+            self._mq_head = head
+            self._mq_ready.set()
+
+    def _process_numpy(self, indata, frames, now, attack_coef, release_coef):
+        """Vectorized meter update; returns indices of channels whose CC changed."""
+        # RMS of every mapped channel in one pass (einsum sums the squares
+        # without materializing them)
+        if isinstance(self._ch_select, slice):
+            sub = indata[:, self._ch_select]
+        elif frames == self.block_size:
+            sub = np.take(indata, self._ch_idx, axis=1, out=self._gathered)
+        else:
+            sub = indata[:, self._ch_idx]
+        rms_vec = self._rms
+        np.einsum('ij,ij->j', sub, sub, out=rms_vec)
+        rms_vec *= np.float32(1.0 / frames)
+        np.sqrt(rms_vec, out=rms_vec)
+
+        # Averaged RMS -> 0-1 level (-60dB..0dB) via the lookup table
+        avg_rms = self._average_rms(rms_vec)
+        buckets = (avg_rms * self._lut_scale + 0.5).astype(np.intp)
+        np.clip(buckets, 0, self._lut_scale, out=buckets)
+        levels = self._level_lut[buckets]
+
+        # Time-based smoothing (proper VU ballistics): fast attack, slow release
+        coef = np.where(levels > self.smoothed, np.float32(attack_coef), np.float32(1 - release_coef))
+        self.smoothed += (levels - self.smoothed) * coef
+
+        # Peak hold, then fall gradually toward the smoothed level instead of snapping
+        new_peak = self.smoothed >= self.peaks
+        held_over = now - self.peak_times - self._peak_hold_ns
+        falling = ~new_peak & (held_over > 0)
+        fall_coef = np.exp(np.maximum(held_over, 0).astype(np.float32) * np.float32(-1 / self._release_ns))
+        self.peaks[:] = np.where(
+            new_peak, self.smoothed,
+            np.where(falling, self.smoothed + (self.peaks - self.smoothed) * fall_coef, self.peaks)
+        )
+        self.peak_times[new_peak] = now
+
+        # Convert to MIDI CC values; report only the ones that changed
+        cc = self._cc
+        np.multiply(self.peaks, np.float32(127), out=cc, casting='unsafe')
+        np.clip(cc, 0, 127, out=cc)
+        if not self.deadband:
+            changed = np.flatnonzero(cc != self.last_cc)
+            self.last_cc[:] = cc
+            return changed
+
+        # Past the deadband, or landing exactly on silence/full scale (so the
+        # meter can always settle there), or never sent
+        last = self.last_cc
+        moved = cc != last
+        changed = np.flatnonzero(
+            moved & ((np.abs(cc - last) > self.deadband) | (cc == 0) | (cc == 127) | (last < 0))
+        )
+        last[changed] = cc[changed]
+        return changed
+
+    def _ring_average(self, rms_vec):
+        """Add readings to the running average ring, replacing the oldest; return the averages."""
+        index, count = self.ring_pos
+        row = self.rms_ring[index]
+        self.rms_sums += rms_vec - row
+        row[:] = rms_vec
+        count = min(count + 1, self.avg_window)
+        self.ring_pos[:] = ((index + 1) % self.avg_window, count)
+        return self.rms_sums * (1.0 / count)
+
+    @staticmethod
+    def _latest_rms(rms_vec):
+        return rms_vec
+
+    def _midi_sender(self):
+        """Drain the CC queue to the MIDI port until stopped."""
+        ready = self._mq_ready
+        send_message = self.midi_out.send_message
+        status = self._status
+        pending = {}  # Newest value per CC for one drain, reused across drains
+        while self.running:
+            # Sleep until the audio callback queues something (or it's time to
+            # check for stop()); clear before reading the head so a push
+            # racing with the drain isn't missed
+            if not ready.wait(STOP_CHECK_INTERVAL):
+                continue
+            ready.clear()
+            tail, head = self._mq_tail, self._mq_head
+            if tail < head:
+                # Only the newest value queued for each CC matters
+                for pos in range(tail, head):
+                    cc_number, value = self._mq[pos % MIDI_QUEUE_SIZE]
+                    pending[int(cc_number)] = int(value)
+                self._mq_tail = head
+
+                for cc_number, value in pending.items():
+                    send_message([status, cc_number, value])
+                pending.clear()
+
+    def run(self):
+        """Send MIDI from the calling thread until stop(), then shut down.
+
+        The audio callback only queues CC values, so it never blocks on MIDI.
+        """
+        try:
+            self._midi_sender()
+        finally:
+            if self.stream:
+                self.stream.stop()
+                self.stream.close()
+            if self.midi_out:
+                self.midi_out.close_port()
+            print("\nStopped.")
 
     def stop(self):
+        """Ask run() to return; safe to call from a signal handler."""
+        # Only a flag: the handler runs on the sender's own thread, which may
+        # hold the event's lock, so setting the event here could deadlock
         self.running = False
-        if self.stream:
-            self.stream.stop()
-            self.stream.close()
-        if self.midi_out:
-            self.midi_out.close_port()
-        print("\nStopped.")
 
 
 def list_audio_devices():
@@ -243,11 +460,15 @@ def parse_channel_mappings(mapping_str):
     """Parse channel mappings like '0:1,1:2,2:3' into {0: 1, 1: 2, 2: 3}"""
     mappings = {}
     for pair in mapping_str.split(','):
-        parts = pair.strip().split(':')
-        if len(parts) != 2:
+        ch_str, sep, cc_str = pair.partition(':')
+        if not sep or ':' in cc_str:
             raise ValueError(f"Invalid mapping: {pair}")
-        audio_ch = int(parts[0])
-        cc_num = int(parts[1])
+        audio_ch = int(ch_str)  # int() ignores surrounding whitespace
+        cc_num = int(cc_str)
+        if audio_ch < 0:
+            raise ValueError(f"Invalid audio channel: {audio_ch}")
+        if not 0 <= cc_num <= 127:
+            raise ValueError(f"Invalid CC number: {cc_num}")
         mappings[audio_ch] = cc_num
     return mappings
 
@@ -289,6 +510,8 @@ Examples:
                         help='Release time in ms (default: 300)')
     parser.add_argument('--avg-window', type=int, default=8,
                         help='RMS averaging window size (default: 8 blocks)')
+    parser.add_argument('--deadband', type=int, default=0,
+                        help='Ignore CC changes of this many steps or fewer (default: 0)')
 
     args = parser.parse_args()
 
@@ -328,21 +551,20 @@ Examples:
         peak_hold_ms=args.peak_hold,
         attack_ms=args.attack,
         release_ms=args.release,
-        avg_window=args.avg_window
+        avg_window=args.avg_window,
+        deadband=args.deadband
     )
 
     # Handle Ctrl+C gracefully
     def signal_handler(sig, frame):
         converter.stop()
-        sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
 
     converter.start()
 
-    # Keep running
-    while converter.running:
-        time.sleep(0.1)
+    # Audio arrives on its own thread; MIDI goes out from this one until Ctrl+C
+    converter.run()
 
 
 if __name__ == '__main__':
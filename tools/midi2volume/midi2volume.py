@@ -10,10 +10,15 @@ Usage:
 """
 
 import argparse
+import ctypes
+import logging
+import logging.handlers
+import queue
 import subprocess
 import sys
 import time
 import threading
+from ctypes import POINTER, byref, c_float, c_int32, c_ubyte, c_uint32, c_void_p
 
 try:
     import rtmidi
@@ -21,11 +26,260 @@ except ImportError:
     print("Error: python-rtmidi not installed. Run: pip install python-rtmidi")
     sys.exit(1)
 
+logger = logging.getLogger('midi2volume')
+
+# Minimum spacing between "Volume:" log lines; with a short --debounce the
+# volume can change far faster than anyone can read it
+LOG_INTERVAL_NS = 50_000_000
+
+
+def _start_log_listener():
+    """Route log records through a queue so the volume path never blocks on stdout."""
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+    return listener
+
+
+def _fourcc(code):
+    """Convert a four-character CoreAudio selector to its integer value."""
+    return int.from_bytes(code.encode('ascii'), 'big')
+
+
+kAudioObjectSystemObject = 1
+kAudioHardwarePropertyDefaultOutputDevice = _fourcc('dOut')
+kAudioDevicePropertyVolumeScalar = _fourcc('volm')
+kAudioObjectPropertyScopeGlobal = _fourcc('glob')
+kAudioDevicePropertyScopeOutput = _fourcc('outp')
+kAudioObjectPropertyElementMain = 0
+
+
+class AudioObjectPropertyAddress(ctypes.Structure):
+    _fields_ = [
+        ('mSelector', c_uint32),
+        ('mScope', c_uint32),
+        ('mElement', c_uint32),
+    ]
+
+
+try:
+    _coreaudio = ctypes.CDLL('/System/Library/Frameworks/CoreAudio.framework/CoreAudio')
+except OSError:
+    _coreaudio = None
+
+COREAUDIO_AVAILABLE = _coreaudio is not None
+
+# Property addresses and prototypes are built once at import; every
+# volume read/write reuses them instead of re-marshalling per call.
+_ADDR_DEFAULT_OUTPUT = AudioObjectPropertyAddress(
+    kAudioHardwarePropertyDefaultOutputDevice,
+    kAudioObjectPropertyScopeGlobal,
+    kAudioObjectPropertyElementMain,
+)
+_ADDR_VOL_MASTER = AudioObjectPropertyAddress(
+    kAudioDevicePropertyVolumeScalar, kAudioDevicePropertyScopeOutput, 0)
+_ADDR_VOL_CH1 = AudioObjectPropertyAddress(
+    kAudioDevicePropertyVolumeScalar, kAudioDevicePropertyScopeOutput, 1)
+_ADDR_VOL_CH2 = AudioObjectPropertyAddress(
+    kAudioDevicePropertyVolumeScalar, kAudioDevicePropertyScopeOutput, 2)
+
+if COREAUDIO_AVAILABLE:
+    _AddressPtr = POINTER(AudioObjectPropertyAddress)
+
+    _coreaudio.AudioObjectGetPropertyData.argtypes = [
+        c_uint32, _AddressPtr, c_uint32, c_void_p, POINTER(c_uint32), c_void_p]
+    _coreaudio.AudioObjectGetPropertyData.restype = c_int32
+    _coreaudio.AudioObjectSetPropertyData.argtypes = [
+        c_uint32, _AddressPtr, c_uint32, c_void_p, c_uint32, c_void_p]
+    _coreaudio.AudioObjectSetPropertyData.restype = c_int32
+    _coreaudio.AudioObjectHasProperty.argtypes = [c_uint32, _AddressPtr]
+    _coreaudio.AudioObjectHasProperty.restype = c_ubyte
+    _coreaudio.AudioObjectIsPropertySettable.argtypes = [
+        c_uint32, _AddressPtr, POINTER(c_ubyte)]
+    _coreaudio.AudioObjectIsPropertySettable.restype = c_int32
+    _coreaudio.AudioObjectAddPropertyListener.argtypes = [
+        c_uint32, _AddressPtr, c_void_p, c_void_p]
+    _coreaudio.AudioObjectAddPropertyListener.restype = c_int32
+
+AudioObjectPropertyListenerProc = ctypes.CFUNCTYPE(
+    c_int32, c_uint32, c_uint32, POINTER(AudioObjectPropertyAddress), c_void_p)
+
+# Default output device id, cached until CoreAudio reports a change
+_default_device_id = None
+_default_device_lock = threading.Lock()
+_default_device_listener = None
+
+
+def _on_default_device_changed(object_id, count, addresses, client_data):
+    """CoreAudio listener: drop the cached default device id."""
+    global _default_device_id
+    _default_device_id = None
+    return 0
+
+
+def _fetch_default_output_device_id():
+    """Query CoreAudio for the current default output device id."""
+    device_id = c_uint32(0)
+    size = c_uint32(ctypes.sizeof(device_id))
+    status = _coreaudio.AudioObjectGetPropertyData(
+        kAudioObjectSystemObject, byref(_ADDR_DEFAULT_OUTPUT),
+        0, None, byref(size), byref(device_id))
+    if status != 0 or not device_id.value:
+        return None
+    return device_id.value
+
+
+def get_default_output_device_id():
+    """Get the default output device id, cached across calls."""
+    global _default_device_id, _default_device_listener
+    device_id = _default_device_id
+    if device_id is not None:
+        return device_id
+
+    with _default_device_lock:
+        if _default_device_listener is None:
+            # Keep a reference so the callback isn't garbage collected
+            _default_device_listener = AudioObjectPropertyListenerProc(
+                _on_default_device_changed)
+            _coreaudio.AudioObjectAddPropertyListener(
+                kAudioObjectSystemObject, byref(_ADDR_DEFAULT_OUTPUT),
+                ctypes.cast(_default_device_listener, c_void_p), None)
+        if _default_device_id is None:
+            _default_device_id = _fetch_default_output_device_id()
+        return _default_device_id
+
+
+def _is_settable(device_id, address):
+    """Check whether a device property exists and can be written."""
+    if not _coreaudio.AudioObjectHasProperty(device_id, byref(address)):
+        return False
+    settable = c_ubyte(0)
+    status = _coreaudio.AudioObjectIsPropertySettable(
+        device_id, byref(address), byref(settable))
+    return status == 0 and bool(settable.value)
+
+
+def get_device_volume(device_id):
+    """Get a device's output volume scalar (0.0-1.0), or None."""
+    for address in (_ADDR_VOL_MASTER, _ADDR_VOL_CH1):
+        if not _coreaudio.AudioObjectHasProperty(device_id, byref(address)):
+            continue
+        volume = c_float(0.0)
+        size = c_uint32(ctypes.sizeof(volume))
+        status = _coreaudio.AudioObjectGetPropertyData(
+            device_id, byref(address), 0, None, byref(size), byref(volume))
+        if status == 0:
+            return volume.value
+    return None
+
+
+# Settable volume elements per device id, resolved on first write
+_volume_elements = {}
+
+# Volume scalar per device id as last written by us or reported by the
+# CoreAudio listener, so writes that would not change anything can be skipped
+_observed_volume = {}
+_volume_listener = None
+
+
+def _on_volume_changed(object_id, count, addresses, client_data):
+    """CoreAudio listener: record the device's new volume scalar."""
+    scalar = get_device_volume(object_id)
+    if scalar is None:
+        _observed_volume.pop(object_id, None)
+    else:
+        _observed_volume[object_id] = scalar
+    return 0
+
+
+def _watch_volume(device_id, address):
+    """Start tracking a device's volume through a CoreAudio listener."""
+    global _volume_listener
+    if _volume_listener is None:
+        # Keep a reference so the callback isn't garbage collected
+        _volume_listener = AudioObjectPropertyListenerProc(_on_volume_changed)
+    status = _coreaudio.AudioObjectAddPropertyListener(
+        device_id, byref(address), ctypes.cast(_volume_listener, c_void_p), None)
+    if status == 0:
+        scalar = get_device_volume(device_id)
+        if scalar is not None:
+            _observed_volume[device_id] = scalar
+
+
+def _find_volume_elements(device_id):
+    """Find which volume elements of a device can be written."""
+    # Prefer the master element; many devices only expose per-channel volume
+    if _is_settable(device_id, _ADDR_VOL_MASTER):
+        return (_ADDR_VOL_MASTER,)
+    return tuple(a for a in (_ADDR_VOL_CH1, _ADDR_VOL_CH2)
+                 if _is_settable(device_id, a))
+
+
+# Reused for every write; volume is only ever set from the controller's
+# single debounce worker thread
+_write_buf = c_float(0.0)
+_write_buf_ref = byref(_write_buf)
+_WRITE_SIZE = ctypes.sizeof(c_float)
+
+
+def _write_volume(device_id, addresses, scalar):
+    """Write the volume scalar to each address; True if all succeed."""
+    _write_buf.value = scalar
+    ok = True
+    for address in addresses:
+        status = _coreaudio.AudioObjectSetPropertyData(
+            device_id, byref(address), 0, None, _WRITE_SIZE, _write_buf_ref)
+        ok = ok and status == 0
+    return ok
+
+
+def set_device_volume(device_id, scalar):
+    """Set a device's output volume scalar (0.0-1.0)."""
+    observed = _observed_volume.get(device_id)
+    if observed is not None and abs(scalar - observed) < 1 / 255:
+        # Already there (e.g. our own previous write echoed back)
+        return True
+
+    addresses = _volume_elements.get(device_id)
+    if addresses and _write_volume(device_id, addresses, scalar):
+        _observed_volume[device_id] = scalar
+        return True
+
+    # First write to this device, or it was reconfigured: probe again
+    addresses = _find_volume_elements(device_id)
+    if not addresses:
+        _volume_elements.pop(device_id, None)
+        return False
+    if device_id not in _volume_elements:
+        _watch_volume(device_id, addresses[0])
+    _volume_elements[device_id] = addresses
+    if not _write_volume(device_id, addresses, scalar):
+        return False
+    # Record our own write now; the listener only catches up asynchronously,
+    # and a stale value would skip a quick S1 -> S2 -> S1 return to S1
+    _observed_volume[device_id] = scalar
+    return True
+
+
+_midi_in = None
+
+
+def get_midi_in():
+    """Get the shared rtmidi input, creating it on first use."""
+    global _midi_in
+    if _midi_in is None:
+        _midi_in = rtmidi.MidiIn()
+    return _midi_in
+
 
 def list_midi_ports():
     """List available MIDI input ports."""
-    midi_in = rtmidi.MidiIn()
-    ports = midi_in.get_ports()
+    ports = get_midi_in().get_ports()
 
     if not ports:
         print("No MIDI input ports found.")
@@ -36,27 +290,88 @@ def list_midi_ports():
         print(f"  {i}: {port}")
 
 
-def set_macos_volume(level):
-    """Set macOS system volume (0-100)."""
-    try:
-        # Clamp to valid range
-        level = max(0, min(100, level))
-        subprocess.run(
-            ['osascript', '-e', f'set volume output volume {level}'],
-            check=True,
-            capture_output=True
-        )
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error setting volume: {e}")
-        return False
-    except FileNotFoundError:
-        print("Error: osascript not found. This tool only works on macOS.")
+def set_macos_volume(level, legacy=False):
+    """Set macOS system volume (0-100). legacy=True always uses osascript."""
+    # Clamp to valid range
+    level = max(0, min(100, level))
+    if COREAUDIO_AVAILABLE and not legacy:
+        device_id = get_default_output_device_id()
+        if device_id is not None and set_device_volume(device_id, level / 100.0):
+            return True
+    return _osascript_set_volume(level)
+
+
+def get_macos_volume(legacy=False):
+    """Get current macOS system volume (0-100). legacy=True always uses osascript."""
+    if COREAUDIO_AVAILABLE and not legacy:
+        device_id = get_default_output_device_id()
+        if device_id is not None:
+            scalar = get_device_volume(device_id)
+            if scalar is not None:
+                return int(round(scalar * 100))
+    return _osascript_get_volume()
+
+
+# Long-running `osascript -i`; each volume change is one line on its stdin
+# instead of a fork/exec plus AppleScript compile
+_osa = None
+_osa_lock = threading.Lock()
+
+
+def _spawn_osascript():
+    """Start an interactive osascript reading commands from a pipe."""
+    return subprocess.Popen(
+        ['osascript', '-i'],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        bufsize=1
+    )
+
+
+def _osascript_set_volume(level):
+    """Set system volume through osascript (fallback when CoreAudio fails)."""
+    global _osa
+    command = f'set volume output volume {level}\n'
+    with _osa_lock:
+        # Retry once with a fresh process if the old one went away
+        for _ in range(2):
+            if _osa is None or _osa.poll() is not None:
+                try:
+                    _osa = _spawn_osascript()
+                except FileNotFoundError:
+                    print("Error: osascript not found. This tool only works on macOS.")
+                    return False
+            try:
+                _osa.stdin.write(command)
+                _osa.stdin.flush()
+                return True
+            except OSError as e:
+                error = e
+                _osa = None
+        print(f"Error setting volume: {error}")
         return False
 
 
-def get_macos_volume():
-    """Get current macOS system volume (0-100)."""
+def close_osascript():
+    """Shut down the persistent osascript process, if any."""
+    global _osa
+    with _osa_lock:
+        if _osa is not None:
+            try:
+                _osa.stdin.close()
+            except OSError:
+                pass
+            try:
+                _osa.wait(timeout=1.0)
+            except subprocess.TimeoutExpired:
+                _osa.kill()
+            _osa = None
+
+
+def _osascript_get_volume():
+    """Get system volume through osascript (fallback when CoreAudio fails)."""
     try:
         result = subprocess.run(
             ['osascript', '-e', 'output volume of (get volume settings)'],
@@ -70,22 +385,38 @@ def get_macos_volume():
 
 
 class MidiVolumeController:
-    def __init__(self, midi_port, midi_channel, cc_number, invert=False, debounce_ms=100):
+    def __init__(self, midi_port, midi_channel, cc_number, invert=False, debounce_ms=100,
+                 legacy_volume=False):
         self.midi_port = midi_port
         self.midi_channel = midi_channel - 1  # Convert to 0-indexed
         self.cc_number = cc_number
+        # Status byte (CC on our channel) and CC number packed into one word
+        self._match_word = ((0xB0 | self.midi_channel) << 8) | cc_number
         self.invert = invert
         self.debounce_ms = debounce_ms
+        self.legacy_volume = legacy_volume
+        # MIDI value (0-127) -> volume (0-100), with inversion baked in
+        if invert:
+            self._cc_to_volume = tuple(int((127 - v) * 100 / 127) for v in range(128))
+        else:
+            self._cc_to_volume = tuple(int(v * 100 / 127) for v in range(128))
         self.running = False
+        self.stopped = threading.Event()
         self.midi_in = None
         self.last_volume = None
-        self.pending_volume = None
-        self.last_update_time = 0
-        self.debounce_timer = None
+        self.last_update_ns = 0
+        self._debounce_ns = debounce_ms * 1_000_000
+        # Newest volume from the MIDI thread; the worker only ever reads
+        # the latest value, so bursts collapse without a Timer per event
+        self._latest = None
+        self._wake = threading.Event()
+        self._worker = None
+        self._last_log_ns = 0
+        self._unlogged = None
 
     def start(self):
         """Start listening for MIDI messages."""
-        self.midi_in = rtmidi.MidiIn()
+        self.midi_in = get_midi_in()
         ports = self.midi_in.get_ports()
 
         # Find the port
@@ -107,8 +438,10 @@ class MidiVolumeController:
             return False
 
         self.midi_in.open_port(port_index)
-        self.midi_in.set_callback(self.midi_callback)
         self.running = True
+        self.stopped.clear()
+        self._worker = threading.Thread(target=self._volume_worker, daemon=True)
+        self._worker.start()
 
         print(f"MIDI Volume Controller")
         print(f"======================")
@@ -116,12 +449,18 @@ class MidiVolumeController:
         print(f"MIDI Channel: {self.midi_channel + 1}")
         print(f"CC Number: {self.cc_number}")
         print(f"Invert: {self.invert}")
+        print(f"Volume control: {'osascript' if self.legacy_volume or not COREAUDIO_AVAILABLE else 'CoreAudio'}")
         print()
 
         # Show current volume
-        current = get_macos_volume()
+        current = get_macos_volume(self.legacy_volume)
         if current is not None:
             print(f"Current system volume: {current}%")
+            # A fader already sitting at this level shouldn't trigger a write
+            self.last_volume = current
+
+        # Only now start taking MIDI, so no CC sees an unseeded last_volume
+        self.midi_in.set_callback(self._make_callback())
 
         print()
         print("Listening for MIDI... Press Ctrl+C to stop")
@@ -131,76 +470,98 @@ class MidiVolumeController:
     def stop(self):
         """Stop listening."""
         self.running = False
-        if self.debounce_timer:
-            self.debounce_timer.cancel()
-            self.debounce_timer = None
+        self.stopped.set()
+        self._wake.set()
+        if self._worker:
+            self._worker.join(timeout=1.0)
+            self._worker = None
         if self.midi_in:
+            self.midi_in.cancel_callback()
             self.midi_in.close_port()
             self.midi_in = None
+        close_osascript()
 
     def apply_volume(self, volume):
         """Actually apply the volume change."""
         if volume != self.last_volume:
             self.last_volume = volume
-            set_macos_volume(volume)
-            print(f"Volume: {volume}%")
-
-    def apply_pending_volume(self):
-        """Apply pending volume (called by debounce timer)."""
-        if self.pending_volume is not None:
-            self.apply_volume(self.pending_volume)
-            self.pending_volume = None
-        self.debounce_timer = None
-
-    def midi_callback(self, event, data=None):
-        """Handle incoming MIDI messages."""
-        message, delta_time = event
+            set_macos_volume(volume, self.legacy_volume)
+            if time.monotonic_ns() - self._last_log_ns >= LOG_INTERVAL_NS:
+                self.log_volume(volume)
+            else:
+                self._unlogged = volume
+
+    def log_volume(self, volume):
+        """Report an applied volume."""
+        self._unlogged = None
+        self._last_log_ns = time.monotonic_ns()
+        logger.info("Volume: %d%%", volume)
+
+    def _volume_worker(self):
+        """Apply the newest volume, at most once every debounce_ms."""
+        while True:
+            if self._unlogged is None:
+                self._wake.wait()
+            elif not self._wake.wait(LOG_INTERVAL_NS / 1e9):
+                # Throttled a log line and the fader has come to rest;
+                # report where it landed
+                self.log_volume(self._unlogged)
+                continue
+            if not self.running:
+                return
+
+            # Debounce: hold off until debounce_ms after the last update
+            delay = (self.last_update_ns + self._debounce_ns - time.monotonic_ns()) / 1e9
+            if delay > 0 and self.stopped.wait(delay):
+                return
+
+            self._wake.clear()
+            volume = self._latest
+            if volume == self.last_volume:
+                # Fader jitter settled back on the current volume; don't
+                # spend a debounce slot on a no-op
+                continue
+            self.last_update_ns = time.monotonic_ns()
+            self.apply_volume(volume)
 
-        if len(message) < 3:
-            return
+    def _make_callback(self):
+        """Build the rtmidi callback with its constants bound as closure variables."""
+        match_word = self._match_word
+        cc_to_volume = self._cc_to_volume
+        wake = self._wake.set
+        last_raw = -1
+        last_volume = None
 
-        status = message[0]
-        cc = message[1]
-        value = message[2]
+        def midi_callback(event, data=None):
+            """Handle incoming MIDI messages."""
+            nonlocal last_raw, last_volume
+            message = event[0]
 
-        # Check if it's a CC message (0xB0-0xBF)
-        if not (0xB0 <= status <= 0xBF):
-            return
+            # Control Change is always exactly three bytes
+            if len(message) != 3:
+                return
 
-        # Check channel
-        msg_channel = status & 0x0F
-        if msg_channel != self.midi_channel:
-            return
+            # One compare covers "is CC", "is our channel" and "is our CC"
+            if ((message[0] << 8) | message[1]) != match_word:
+                return
 
-        # Check CC number
-        if cc != self.cc_number:
-            return
+            # A controller re-sending the same 7-bit value changes nothing
+            value = message[2]
+            if value == last_raw:
+                return
+            last_raw = value
 
-        # Convert MIDI value (0-127) to volume (0-100)
-        if self.invert:
-            value = 127 - value
+            volume = cc_to_volume[value]
+            if volume == last_volume:
+                # Neighbouring CC values often map to the same percentage
+                return
+            last_volume = volume
 
-        volume = int(value * 100 / 127)
+            # Hand off to the worker; values arriving while it waits overwrite this one
+            self._latest = volume
+            wake()
 
-        # Debounce: only apply at most every debounce_ms
-        now = time.time() * 1000
-        time_since_last = now - self.last_update_time
-
-        if time_since_last >= self.debounce_ms:
-            # Enough time has passed, apply immediately
-            self.last_update_time = now
-            self.apply_volume(volume)
-            # Cancel any pending timer
-            if self.debounce_timer:
-                self.debounce_timer.cancel()
-                self.debounce_timer = None
-        else:
-            # Too soon, store as pending and schedule timer
-            self.pending_volume = volume
-            if not self.debounce_timer:
-                delay = (self.debounce_ms - time_since_last) / 1000.0
-                self.debounce_timer = threading.Timer(delay, self.apply_pending_volume)
-                self.debounce_timer.start()
+        return midi_callback
 
 
 def main():
@@ -232,6 +593,8 @@ Examples:
                         help='Invert CC values (127=mute, 0=full)')
     parser.add_argument('--debounce', type=int, default=100,
                         help='Debounce interval in ms (default: 100, max 10 updates/sec)')
+    parser.add_argument('--legacy-volume', action='store_true',
+                        help='Set volume through osascript instead of CoreAudio')
 
     args = parser.parse_args()
 
@@ -247,19 +610,24 @@ Examples:
         midi_channel=args.channel,
         cc_number=args.cc,
         invert=args.invert,
-        debounce_ms=args.debounce
+        debounce_ms=args.debounce,
+        legacy_volume=args.legacy_volume
     )
 
+    log_listener = _start_log_listener()
+
     if not controller.start():
+        log_listener.stop()
         sys.exit(1)
 
     try:
-        while controller.running:
-            time.sleep(0.1)
+        # MIDI arrives on rtmidi's own thread; just block until stopped
+        controller.stopped.wait()
     except KeyboardInterrupt:
         print("\nStopping...")
     finally:
         controller.stop()
+        log_listener.stop()
 
 
 if __name__ == '__main__':
@@ -9,6 +9,12 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from app import app as application
 
+# To run several eventlet workers behind a load balancer (sticky sessions),
+# set SOCKETIO_MESSAGE_QUEUE in config/zebby.py so room emits are shared
+# between them, e.g.:
+#   gunicorn -k eventlet -w 1 --bind 127.0.0.1:5001 wsgi:application
+#   gunicorn -k eventlet -w 1 --bind 127.0.0.1:5002 wsgi:application
+
 # For local development with WebSocket support:
 # from app import app, socketio
 # if __name__ == '__main__':